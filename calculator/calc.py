@@ -213,4 +213,5 @@ def main(page: ft.Page):
     page.add(calc)
 
 
-ft.app(target=main)
+if __name__ == "__main__":
+    ft.app(target=main)
@@ -25,4 +25,5 @@ def main(page: ft.Page):
         )
     )
 
-ft.app(main)
+if __name__ == "__main__":
+    ft.app(main)
@@ -8,4 +8,5 @@ def main(page: ft.Page):
     page.add(ft.FilledButton("Click me!"))
 
 
-ft.app(main)
+if __name__ == "__main__":
+    ft.app(main)
@@ -1,51 +1,97 @@
-import requests
-import json
+import argparse
 import os
+import time
 
-# JSONファイルのURL
-area_url = "https://www.jma.go.jp/bosai/common/const/area.json"
-forecast_url_template = "https://www.jma.go.jp/bosai/forecast/data/forecast/{area_code}.json"
-
-# 保存先のファイル
-output_file = "all_forecasts.json"
-
-# 地域コードを抽出する関数
-def get_area_codes(url):
-    response = requests.get(url)
-    area_data = response.json()
-    
-    # 子地域コードを抽出
-    area_codes = []
-    for center in area_data['centers'].values():
-        area_codes.extend(center['children'])
-    
-    return area_codes
-
-# 天気予報情報を取得する関数
-def fetch_forecast(area_code):
-    url = forecast_url_template.format(area_code=area_code)
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Failed to fetch data for area code {area_code}")
-        return None
+from forecast_cache import CACHE_DIR, ForecastCache
+from forecast_store import SNAPSHOT_PATH, SnapshotReader, SnapshotWriter
+from jma_client import (
+    BASE_URL, MAX_WORKERS, TIMEOUT, RETRIES,
+    area_url, fetch_json, set_base_url, iter_forecasts, iter_refresh_forecasts, get_area_codes, latency_summary,
+)
+
+# 保存先のファイル（1行1地域のスナップショット）
+output_file = SNAPSHOT_PATH
+
+# キャッシュ上の利用者名
+CONSUMER = "aa"
 
 # メイン処理
 def main():
-    area_codes = get_area_codes(area_url)
-    all_forecasts = {}
-
-    for area_code in area_codes:
-        forecast_data = fetch_forecast(area_code)
-        if forecast_data:
-            all_forecasts[area_code] = forecast_data
-            print(f"Fetched forecast data for area code {area_code}")
-    
-    # 全ての天気予報データを一つのJSONファイルに保存
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(all_forecasts, f, ensure_ascii=False, indent=2)
+    parser = argparse.ArgumentParser(description="気象庁の天気予報を全地域分取得する")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="同時接続数（1で逐次取得）")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="1リクエストのタイムアウト秒数")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="失敗時のリトライ回数")
+    parser.add_argument("--no-cache", action="store_true", help="forecasts/のキャッシュを使わず全件取得する")
+    parser.add_argument("--base-url", default=BASE_URL, help="取得先（ローカルの fixture_server.py など）")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="スナップショットとキャッシュの保存先")
+    args = parser.parse_args()
+    set_base_url(args.base_url)
+
+    area_codes = get_area_codes(fetch_json(area_url(), timeout=args.timeout, retries=args.retries))
+
+    start = time.perf_counter()
+    latencies = {}
+    cache = None if args.no_cache else ForecastCache(args.cache_dir)
+    # 取得できた地域から順に書き出し、全国分をメモリに溜めない
+    writer = SnapshotWriter(output_file)
+    failed = []
+    try:
+        if cache is None:
+            for area_code, forecast_data, latencies[area_code] in iter_forecasts(
+                area_codes, max_workers=args.workers, timeout=args.timeout, retries=args.retries
+            ):
+                if forecast_data:
+                    writer.write(area_code, forecast_data)
+                    print(f"Fetched forecast data for area code {area_code}")
+                else:
+                    failed.append(area_code)
+            # 取得できなかった地域は前回のスナップショットから補う
+            if failed and os.path.exists(output_file):
+                previous = SnapshotReader(output_file)
+                for area_code in failed:
+                    forecast_data = previous.get(area_code)
+                    if forecast_data:
+                        writer.write(area_code, forecast_data)
+        else:
+            # 条件付きGETで更新された地域だけを取得する
+            unchanged = []
+            for area_code, status, forecast_data, latencies[area_code] in iter_refresh_forecasts(
+                area_codes, cache, CONSUMER, force=not os.path.exists(output_file),
+                max_workers=args.workers, timeout=args.timeout, retries=args.retries
+            ):
+                if status == "updated":
+                    writer.write(area_code, forecast_data)
+                    print(f"Fetched forecast data for area code {area_code}")
+                elif status == "unchanged":
+                    unchanged.append(area_code)
+                else:
+                    failed.append(area_code)
+            print(f"更新: {len(writer)} 件, 変化なし: {len(unchanged)} 件, 失敗: {len(failed)} 件")
+            if not len(writer):
+                writer.abort()
+                print(f"取得時間: {time.perf_counter() - start:.3f}s / {latency_summary(latencies)}")
+                print(f"{output_file} は最新です")
+                return
+            # 変化のない地域と取得できなかった地域は、前回取得したスナップショットから補う
+            for area_code in unchanged + failed:
+                forecast_data = cache.load(area_code)
+                if forecast_data:
+                    writer.write(area_code, forecast_data)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    print(f"取得時間: {time.perf_counter() - start:.3f}s / {latency_summary(latencies)}")
     print(f"All forecast data has been saved to {output_file}")
+    if failed:
+        restored = [area_code for area_code in failed if area_code in writer]
+        print(f"取得できなかった地域: {', '.join(failed)}（うち {len(restored)} 地域は前回のデータを使いました）")
+
+    if cache is not None:
+        # 取得できなかった地域は次回また取り込む
+        for area_code in area_codes:
+            if area_code in writer and area_code not in failed:
+                cache.mark_ingested(area_code, CONSUMER)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,103 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+import time
+
+# area.json を一度だけ解析し、pickle形式のキャッシュ（area.json.cache）から読み込む
+# （キャッシュは自分で書いたファイルだけを読む。他から受け取ったものを置かないこと）
+#
+#   python jma/area_cache.py   # JSONとキャッシュの読み込み時間を比べる
+
+AREA_PATH = "jma/area.json"
+
+# キャッシュの形式を変えたら上げる
+CACHE_FORMAT = 1
+
+
+def cache_path_for(path):
+    return f"{path}.cache"
+
+
+def _write_cache(cache_path, header, area):
+    # 書きかけのキャッシュを読まれないよう一時ファイルから置き換える。書けなければ諦める
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(area, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def _loads(data):
+    # 大量のdictを作る間はGCを止める（止めないと読み込みの半分近くがGCになる）
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def load_area(path=AREA_PATH):
+    """area.json を centers・offices・class10s・class15s・class20s のdictとして読み込む
+
+    キャッシュは元ファイルの更新時刻とサイズが同じならそのまま使う。
+    どちらかが違っても内容のハッシュが同じなら使い、更新時刻だけ記録し直す。
+    """
+    stat = os.stat(path)
+    cache_path = cache_path_for(path)
+    cached = None
+    try:
+        with open(cache_path, 'rb') as f:
+            header = pickle.load(f)
+            if isinstance(header, tuple) and len(header) == 4 and header[0] == CACHE_FORMAT:
+                if header[1:3] == (stat.st_mtime_ns, stat.st_size):
+                    return _loads(f.read())
+                cached = header[3], _loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+
+    with open(path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha1(source).hexdigest()
+    header = (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size, digest)
+    # git checkout などで更新時刻だけが変わった場合は解析し直さない
+    if cached is not None and cached[0] == digest:
+        area = cached[1]
+    else:
+        area = json.loads(source)
+    _write_cache(cache_path, header, area)
+    return area
+
+
+def region_codes(area):
+    """centers の children を順に並べた府県予報区コード"""
+    codes = []
+    for center in area['centers'].values():
+        codes.extend(center['children'])
+    return codes
+
+
+if __name__ == "__main__":
+    def best_of(func, repeat=20):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def parse_json():
+        with open(AREA_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    load_area()  # キャッシュを作る
+    json_ms = best_of(parse_json)
+    cache_ms = best_of(load_area)
+    print(f"JSON: {json_ms:.2f}ms / キャッシュ: {cache_ms:.2f}ms（{json_ms / cache_ms:.1f}倍）")
+    assert load_area() == parse_json()
@@ -0,0 +1,87 @@
+import functools
+import json
+
+# area.json の階層（上位から順）
+LEVELS = ("centers", "offices", "class10s", "class15s", "class20s")
+PARENT_LEVEL = {child: parent for parent, child in zip(LEVELS, LEVELS[1:])}
+CHILD_LEVEL = {parent: child for parent, child in zip(LEVELS, LEVELS[1:])}
+
+
+class AreaIndex:
+    """area.json の全階層をコードで引ける索引
+
+    同じコードが別の階層に存在することがある（例: 011000 は centers・offices・class10s のすべて）ため、
+    階層を省略した場合は上位の階層を優先する。
+    """
+
+    def __init__(self, area_data):
+        self._nodes = {level: area_data.get(level, {}) for level in LEVELS}
+        self._level_of = {}
+        for level in LEVELS:
+            for code in self._nodes[level]:
+                self._level_of.setdefault(code, level)
+
+    def __len__(self):
+        return sum(len(nodes) for nodes in self._nodes.values())
+
+    def __contains__(self, code):
+        return code in self._level_of
+
+    def level_of(self, code):
+        """コードが属する（最上位の）階層名"""
+        return self._level_of.get(code)
+
+    def node(self, code, level=None):
+        """コードに対応するarea.jsonの要素（なければNone）"""
+        level = level or self._level_of.get(code)
+        if level is None:
+            return None
+        return self._nodes[level].get(code)
+
+    def codes(self, level):
+        """指定した階層のコード一覧"""
+        return list(self._nodes[level])
+
+    def name(self, code, level=None):
+        """コードから地域名を取得"""
+        node = self.node(code, level)
+        return node["name"] if node else None
+
+    def parent(self, code, level=None):
+        """親の (階層, コード)。最上位ならNone"""
+        level = level or self._level_of.get(code)
+        node = self.node(code, level)
+        if not node or level not in PARENT_LEVEL or "parent" not in node:
+            return None
+        return PARENT_LEVEL[level], node["parent"]
+
+    def children(self, code, level=None):
+        """子の (階層, コード) の一覧"""
+        level = level or self._level_of.get(code)
+        node = self.node(code, level)
+        if not node or level not in CHILD_LEVEL:
+            return []
+        child_level = CHILD_LEVEL[level]
+        return [(child_level, child) for child in node.get("children", [])]
+
+    def ancestors(self, code, level=None):
+        """親から最上位までの (階層, コード) の一覧"""
+        result = []
+        current = self.parent(code, level)
+        while current is not None:
+            result.append(current)
+            current = self.parent(current[1], current[0])
+        return result
+
+    def as_dict(self):
+        """area.json と同じ形のdict"""
+        return dict(self._nodes)
+
+    @functools.cached_property
+    def serialized(self):
+        """余白なしのJSON（UTF-8）。一度作ったものを使い回す"""
+        return json.dumps(self._nodes, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def from_serialized(cls, data):
+        return cls(json.loads(data))
@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+# 表示中の1行（階層, コード, 字下げの深さ）
+TreeRow = namedtuple("TreeRow", ["level", "code", "depth"])
+
+
+class AreaTree:
+    """展開されている地域だけを行として持つ階層ツリー
+
+    子の行は親を展開したときに初めて作り、折りたたむと取り除く。
+    そのため全階層（約2,300地域）を辿れても、行の数は開いている分だけで済む。
+    """
+
+    def __init__(self, index, root_level="centers"):
+        self.index = index
+        self.rows = [TreeRow(root_level, code, 0) for code in index.codes(root_level)]
+        self.expanded = set()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def position(self, level, code):
+        """行の位置（表示されていなければNone）"""
+        for i, row in enumerate(self.rows):
+            if row.level == level and row.code == code:
+                return i
+        return None
+
+    def is_expandable(self, level, code):
+        return bool(self.index.children(code, level))
+
+    def is_expanded(self, level, code):
+        return (level, code) in self.expanded
+
+    def office_of(self, level, code):
+        """行に対応する府県予報区のコード（地方ならNone）"""
+        if level == "offices":
+            return code
+        for ancestor_level, ancestor in self.index.ancestors(code, level):
+            if ancestor_level == "offices":
+                return ancestor
+        return None
+
+    def toggle(self, position):
+        """position の行を展開/折りたたみし、(取り除いた行, 追加した行) を返す
+
+        変化は position の直後にだけ起きるので、表示側はその範囲だけを差し替えればよい。
+        """
+        row = self.rows[position]
+        key = (row.level, row.code)
+        if key in self.expanded:
+            end = position + 1
+            while end < len(self.rows) and self.rows[end].depth > row.depth:
+                self.expanded.discard((self.rows[end].level, self.rows[end].code))
+                end += 1
+            removed = self.rows[position + 1:end]
+            del self.rows[position + 1:end]
+            self.expanded.discard(key)
+            return removed, []
+
+        children = [
+            TreeRow(level, code, row.depth + 1) for level, code in self.index.children(row.code, row.level)
+        ]
+        if not children:
+            return [], []
+        self.rows[position + 1:position + 1] = children
+        self.expanded.add(key)
+        return [], children
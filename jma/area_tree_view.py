@@ -0,0 +1,87 @@
+import flet as ft
+
+from area_tree import AreaTree
+from ui_metrics import record_update
+
+# 行の高さを固定すると、ListViewは画面に入る行だけを組み立てて描画する
+ROW_HEIGHT = 40
+INDENT = 16
+
+
+class AreaTreeView:
+    """地方から市町村（class20）までをたどれるサイドバー
+
+    ListView の行は展開した分だけ作り、展開/折りたたみでは変化した範囲だけを差し替える。
+    行を選ぶと、その地域を含む府県予報区のコードで on_select_region を呼ぶ。
+    """
+
+    def __init__(self, index, on_select_region, root_level="centers"):
+        # 地域の階層は全セッションで共有する索引を参照し、セッションごとには開いている行だけを持つ
+        self.tree = AreaTree(index, root_level)
+        self.on_select_region = on_select_region
+        self.selected = None
+        self.view = ft.ListView(
+            [self._tile(row) for row in self.tree.rows],
+            item_extent=ROW_HEIGHT,
+            expand=True,
+            data=self,  # ListViewからツリーをたどれるようにする
+        )
+
+    def _icon(self, level, code):
+        if not self.tree.is_expandable(level, code):
+            return ft.icons.PLACE_OUTLINED
+        return ft.icons.EXPAND_MORE if self.tree.is_expanded(level, code) else ft.icons.CHEVRON_RIGHT
+
+    def _tile(self, row):
+        key = (row.level, row.code)
+        return ft.ListTile(
+            leading=ft.Icon(self._icon(row.level, row.code), size=18),
+            title=ft.Text(self.tree.index.name(row.code, row.level), no_wrap=True),
+            dense=True,
+            selected=key == self.selected,
+            content_padding=ft.padding.only(left=8 + row.depth * INDENT, right=8),
+            on_click=lambda e, key=key: self.on_click(*key),
+        )
+
+    def on_click(self, level, code):
+        position = self.tree.position(level, code)
+        if position is None:
+            return
+        changed = []
+        if self.tree.is_expandable(level, code):
+            changed.extend(self._toggle(position))
+
+        office_code = self.tree.office_of(level, code)
+        if office_code is not None:
+            changed.extend(self._select((level, code)))
+
+        if self.view.page is not None:
+            self.view.update()
+            record_update(f"tree:{code}", self.view.page, *changed)
+        if office_code is not None:
+            self.on_select_region(office_code)
+
+    def _toggle(self, position):
+        row = self.tree.rows[position]
+        removed, added = self.tree.toggle(position)
+        # ListView の行は tree.rows と同じ順に並んでいる
+        tiles = [self._tile(child) for child in added]
+        start = position + 1
+        self.view.controls[start:start + len(removed)] = tiles
+
+        tile = self.view.controls[position]
+        tile.leading.name = self._icon(row.level, row.code)
+        return [tile] + tiles
+
+    def _select(self, key):
+        changed = []
+        if self.selected is not None:
+            previous = self.tree.position(*self.selected)
+            if previous is not None:
+                self.view.controls[previous].selected = False
+                changed.append(self.view.controls[previous])
+        self.selected = key
+        tile = self.view.controls[self.tree.position(*key)]
+        tile.selected = True
+        changed.append(tile)
+        return changed
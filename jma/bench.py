@@ -0,0 +1,370 @@
+import argparse
+import contextlib
+import gc
+import io
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# 天気アプリのよく通る処理を合成データで計測する
+#
+#   python jma/bench.py                               # 実データと同じ規模
+#   python jma/bench.py --scale 10 --history-days 365 # 地域数10倍・1年分の履歴
+#   python jma/bench.py --save-baseline               # 基準値を保存
+#   python jma/bench.py --compare                     # 基準値より遅くなっていれば終了コード1
+#
+# format_weather_info と sidebar は flet がないと省略されるので、基準値は flet を入れた環境で保存する。
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'jmaII'))
+
+from area_index import AreaIndex
+from area_tree import AreaTree
+from forecast_model import normalize_forecast
+from forecast_store import SnapshotReader, SnapshotWriter
+from synthetic import JST, iter_history, make_area, make_forecasts, office_codes
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+# 基準値からこの割合を超えて遅く（大きく）なったら劣化とみなす
+TOLERANCE = 0.25
+# 比べる指標（時間は中央値、メモリはピーク）
+COMPARED = ("p50_ms", "peak_kb")
+
+
+def percentile(values, q):
+    """values の q パーセンタイル（線形補間）"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def measure(func, repeat):
+    """funcをrepeat回実行した時間と、1回分のメモリのピークを測る"""
+    func()  # 1回目は読み込みやキャッシュの影響を除くため捨てる
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # tracemallocは処理を遅くするので時間とは別に測る
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def load_app(path, name):
+    """アプリのスクリプトを別名のモジュールとして読み込む（fletがなければNone）"""
+    if importlib.util.find_spec("flet") is None:
+        return None
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Workload:
+    """計測に使う合成データと一時ファイル"""
+
+    def __init__(self, scale=1, horizon=7, history_days=30, seed=0):
+        # 既定の1倍で府県予報区66・class20約3,000（実データ以上）になるようにする
+        self.area = make_area(offices_per_center=6 * scale)
+        self.index = AreaIndex(self.area)
+        self.forecasts = make_forecasts(self.area, horizon=horizon, seed=seed)
+        self.codes = office_codes(self.area)
+        self.class20_codes = list(self.index.codes("class20s"))
+        self.history_days = history_days
+        self.horizon = horizon
+        self.random = random.Random(seed)
+        self.directory = tempfile.mkdtemp(prefix="jma-bench-")
+        self.columns = {code: normalize_forecast(code, data) for code, data in self.forecasts.items()}
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def stage_normalize(w):
+    for code, data in w.forecasts.items():
+        normalize_forecast(code, data)
+
+
+def stage_area_index(w):
+    index = w.index
+    for code in w.class20_codes:
+        index.name(code, "class20s")
+        index.ancestors(code, "class20s")
+    for code in w.codes:
+        index.children(code, "offices")
+
+
+def stage_area_tree(w):
+    # サイドバーのツリーを全階層まで開いてからすべて閉じる
+    tree = AreaTree(w.index)
+    position = 0
+    while position < len(tree.rows):
+        row = tree.rows[position]
+        if tree.is_expandable(row.level, row.code):
+            tree.toggle(position)
+        position += 1
+    for position in reversed([i for i, row in enumerate(tree.rows) if row.depth == 0]):
+        tree.toggle(position)
+
+
+def stage_snapshot_write(w):
+    with SnapshotWriter(w.path("snapshot.ndjson")) as writer:
+        for code, data in w.forecasts.items():
+            writer.write(code, data)
+
+
+def stage_snapshot_read(w):
+    reader = SnapshotReader(w.path("snapshot.ndjson"))
+    for code in w.codes:
+        reader.get(code)
+
+
+def stage_ingest_parse(w):
+    from pipeline import parse_forecast
+
+    for code, data in w.forecasts.items():
+        parse_forecast(code, data)
+
+
+def _ingest(w, db_file):
+    from pipeline import _first_dates, parse_forecast
+    from schema import PRUNE_TEMP, PRUNE_WEATHER, UPSERT_TEMP_DETAIL, UPSERT_WEATHER_DETAIL
+    from temps import connect, create_table
+
+    connection = connect(db_file)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # 作成のメッセージは出さない
+            create_table(connection)
+        weather_rows, temp_rows = [], []
+        for code, data in w.forecasts.items():
+            weather, temps = parse_forecast(code, data)
+            weather_rows.extend(weather)
+            temp_rows.extend(temps)
+        with connection:
+            connection.executemany(UPSERT_WEATHER_DETAIL, weather_rows)
+            connection.executemany(PRUNE_WEATHER, _first_dates(weather_rows))
+            connection.executemany(UPSERT_TEMP_DETAIL, temp_rows)
+            connection.executemany(PRUNE_TEMP, _first_dates(temp_rows))
+    finally:
+        connection.close()
+
+
+def stage_ingest_write(w):
+    _ingest(w, w.path("weather.db"))
+
+
+def stage_sql_join(w):
+    db = w.sql_db
+    for code in w.codes:
+        db.fetch_forecast(code)
+
+
+def stage_archive_add(w):
+    from archive import ForecastArchive
+
+    path = w.path("archive.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    archive = ForecastArchive(path)
+    try:
+        batch = []
+        for item in iter_history(w.codes, days=w.history_days, horizon=w.horizon):
+            batch.append(item)
+            if len(batch) >= 256:
+                archive.add_many(batch)
+                batch = []
+        archive.add_many(batch)
+    finally:
+        archive.close()
+
+
+def stage_archive_as_of(w):
+    archive = w.archive
+    end = w.archive_end
+    for _ in range(200):
+        code = w.random.choice(w.codes)
+        moment = end - timedelta(hours=w.random.randrange(0, w.history_days * 24))
+        archive.as_of(code, moment.isoformat())
+
+
+def stage_format_weather_info(w):
+    app = w.app
+    # 地域数はキャッシュの件数より少ないので、毎回捨てないと2回目以降はキャッシュを引くだけになる
+    app.panel_cache.invalidate()
+    for columns in w.columns.values():
+        app.format_weather_info(columns)
+
+
+def stage_sidebar(w):
+    w.app.sidebar(lambda region_code: None)
+
+
+def _prepare_sql(w):
+    from weather_db import WeatherDB
+
+    _ingest(w, w.path("sql.db"))
+    w.sql_db = WeatherDB(w.path("sql.db"))
+
+
+def _prepare_archive(w):
+    from archive import ForecastArchive
+
+    stage_archive_add(w)
+    w.archive = ForecastArchive(w.path("archive.db"))
+    w.archive_end = max(
+        datetime.fromisoformat(data[0]["reportDatetime"]).astimezone(JST) for data in w.forecasts.values()
+    )
+
+
+def _prepare_app(w):
+    app = load_app(os.path.join(ROOT, "jma", "main.py"), "bench_jma_main")
+    if app is None:
+        return False
+    # アプリが参照するデータを合成データに差し替える
+    app.get_area_index = lambda: w.index
+    w.app = app
+    return True
+
+
+# (名前, 処理, 準備) 準備がFalseを返したら飛ばす
+STAGES = [
+    ("normalize_forecast", stage_normalize, None),
+    ("area_index", stage_area_index, None),
+    ("area_tree", stage_area_tree, None),
+    ("snapshot_write", stage_snapshot_write, None),
+    ("snapshot_read", stage_snapshot_read, stage_snapshot_write),
+    ("ingest_parse", stage_ingest_parse, None),
+    ("ingest_write", stage_ingest_write, None),
+    ("sql_join", stage_sql_join, _prepare_sql),
+    ("archive_add", stage_archive_add, None),
+    ("archive_as_of", stage_archive_as_of, _prepare_archive),
+    ("format_weather_info", stage_format_weather_info, _prepare_app),
+    ("sidebar", stage_sidebar, _prepare_app),
+]
+
+
+def run(scale=1, horizon=7, history_days=30, repeat=20, only=None, seed=0):
+    """各段階を計測して {段階名: 結果} を返す"""
+    workload = Workload(scale=scale, horizon=horizon, history_days=history_days, seed=seed)
+    results = {}
+    try:
+        for name, func, prepare in STAGES:
+            if only and name not in only:
+                continue
+            if prepare is not None and prepare(workload) is False:
+                print(f"{name}: fletがないため省略")
+                continue
+            # 履歴の書き込みは重いので回数を減らす
+            result = measure(lambda: func(workload), repeat if name != "archive_add" else max(1, repeat // 10))
+            results[name] = result
+            print(
+                f"{name:<20} p50 {result['p50_ms']:>9.3f}ms  p95 {result['p95_ms']:>9.3f}ms  "
+                f"p99 {result['p99_ms']:>9.3f}ms  peak {result['peak_kb']:>9.1f}KB"
+            )
+    finally:
+        if getattr(workload, "sql_db", None) is not None:
+            workload.sql_db.close()
+        if getattr(workload, "archive", None) is not None:
+            workload.archive.close()
+        workload.cleanup()
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """基準値より劣化した指標を (段階, 指標, 基準値, 今回) で返す"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in COMPARED:
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append((name, key, base[key], result[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="天気アプリの主な処理のベンチマーク")
+    parser.add_argument("--scale", type=int, default=1, help="府県予報区を何倍に増やすか")
+    parser.add_argument("--horizon", type=int, default=7, help="予報の日数")
+    parser.add_argument("--history-days", type=int, default=30, help="アーカイブに入れる履歴の日数")
+    parser.add_argument("--repeat", type=int, default=20, help="各段階の実行回数")
+    parser.add_argument("--only", nargs="*", help="計測する段階の名前")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基準値のファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準値として保存する")
+    parser.add_argument("--compare", action="store_true", help="基準値と比べ、劣化があれば終了コード1")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="劣化とみなす割合（0.25で25%%）")
+    args = parser.parse_args()
+    # 基準値と比べられるのは、合成データと実行回数が同じときだけ
+    settings = {
+        "scale": args.scale, "horizon": args.horizon, "history_days": args.history_days, "repeat": args.repeat,
+    }
+
+    if args.compare:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            # 劣化（終了コード1）と区別できるように終了コード2で終える
+            print(
+                f"基準値の設定 {baseline.get('settings')} と今回の設定 {settings} が異なるため比べられません"
+                "（同じ設定で実行するか、--save-baseline で保存し直してください）",
+                file=sys.stderr,
+            )
+            sys.exit(2)
+
+    results = run(args.scale, args.horizon, args.history_days, args.repeat, args.only)
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            # 同じ設定なら、今回計測しなかった段階の基準値は残す
+            if baseline.get("settings") == settings:
+                saved = baseline.get("results", {})
+        saved.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"settings": settings, "results": saved}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基準値を {args.baseline} に保存しました")
+
+    if args.compare:
+        regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        for name, key, base, current in regressions:
+            print(f"劣化: {name} {key} {base} -> {current}")
+        if regressions:
+            sys.exit(1)
+        print("基準値からの劣化はありません")
+
+
+if __name__ == "__main__":
+    main()
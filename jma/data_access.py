@@ -0,0 +1,126 @@
+import functools
+import os
+import threading
+from types import MappingProxyType
+
+import area_cache
+from area_index import AreaIndex
+from forecast_model import normalize_forecast
+from forecast_store import SNAPSHOT_PATH, SnapshotReader, index_path_for
+
+# 地域定義ファイルのパス
+AREA_PATH = "jma/area.json"
+
+# 表示中のスナップショット（パスごと）と、読み込んだときの索引の更新時刻
+_snapshots = {}
+_snapshot_mtimes = {}
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_mtime(path):
+    try:
+        return os.stat(index_path_for(path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ForecastSnapshot:
+    """ある時点の全地域の予報（全セッションで共有する読み取り専用のデータ）
+
+    作ったあとは中身を入れ替えず、新しい予報は新しいスナップショットとして差し替える。
+    reader から作ったものは地域ごとに初めて使うときに読み込み、
+    forecasts から作ったものは preload() で先に正規化しておける。
+    """
+
+    def __init__(self, reader=None, forecasts=None):
+        self.reader = reader
+        self.forecasts = forecasts
+        self._columns = {}
+
+    def get(self, code):
+        """1地域分の予報JSON"""
+        if self.forecasts is not None:
+            return self.forecasts.get(code)
+        return self.reader.get(code)
+
+    def columns(self, code):
+        """1地域分の予報を日付軸に揃えた列形式で返す（正規化は地域ごとに一度だけ）"""
+        if code not in self._columns:
+            self._columns[code] = _freeze(normalize_forecast(code, self.get(code)))
+        return self._columns[code]
+
+    def preload(self):
+        """全地域を正規化しておく（差し替える前に別スレッドで呼ぶ）"""
+        for code in (self.forecasts if self.forecasts is not None else self.reader):
+            self.columns(code)
+        return self
+
+
+def _freeze(columns):
+    # セッション間で共有するので、書き換えられないようにしておく
+    if columns is None:
+        return None
+    return MappingProxyType({
+        key: tuple(value) if isinstance(value, list) else value for key, value in columns.items()
+    })
+
+
+@functools.lru_cache(maxsize=None)
+def load_area(path=AREA_PATH):
+    """area.jsonを初めて必要になったときに読み込む（2回目以降の起動はキャッシュから）"""
+    return area_cache.load_area(path)
+
+
+def get_centers():
+    """サイドバーに使う地方（centers）の一覧"""
+    return load_area()['centers']
+
+
+def get_offices():
+    """府県予報区（offices）の一覧"""
+    return load_area()['offices']
+
+
+@functools.lru_cache(maxsize=None)
+def get_area_index(path=AREA_PATH):
+    """全階層をコードで引ける索引（一度だけ作る）"""
+    return AreaIndex(load_area(path))
+
+
+def get_snapshot(path=SNAPSHOT_PATH):
+    """表示中のスナップショット（初回は索引だけを読み込む）"""
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        with _snapshot_lock:
+            snapshot = _snapshots.get(path)
+            if snapshot is None:
+                _snapshot_mtimes[path] = _snapshot_mtime(path)
+                snapshot = _snapshots[path] = ForecastSnapshot(reader=SnapshotReader(path))
+    return snapshot
+
+
+def get_forecast(code, path=SNAPSHOT_PATH):
+    """1地域分の予報JSONをスナップショットから読み込む"""
+    return get_snapshot(path).get(code)
+
+
+def get_forecast_columns(code, path=SNAPSHOT_PATH):
+    """1地域分の予報を日付軸に揃えた列形式で返す（読み取り専用）"""
+    return get_snapshot(path).columns(code)
+
+
+def swap_snapshot(snapshot, path=SNAPSHOT_PATH):
+    """組み立て済みのスナップショットに差し替える（ファイルを書き終えてから呼ぶ）"""
+    with _snapshot_lock:
+        _snapshots[path] = snapshot
+        _snapshot_mtimes[path] = _snapshot_mtime(path)
+
+
+def refresh_snapshot(path=SNAPSHOT_PATH):
+    """スナップショットが取り込み後に置き換わっていれば読み直す（読み直したらTrue）"""
+    with _snapshot_lock:
+        if path not in _snapshots or _snapshot_mtimes.get(path) == _snapshot_mtime(path):
+            return False
+        # 次に使うときに新しいファイルから読み込む
+        del _snapshots[path]
+        return True
@@ -0,0 +1,189 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 気象庁APIの代わりに area.json と forecasts/*.json を返すローカルサーバー
+#
+#   python jma/fixture_server.py --port 8000 --latency 0.05 --error-rate 0.02 --scale 20
+#   JMA_BASE_URL=http://127.0.0.1:8000/bosai python jmaII/pipeline.py --db /tmp/load.db --cache-dir /tmp/forecasts
+
+AREA_PATH = "/bosai/common/const/area.json"
+FORECAST_PREFIX = "/bosai/forecast/data/forecast/"
+
+ETAG_MODES = ("content", "none", "always-new")
+
+
+def build_fixtures(area_json, forecast_dir, scale=1):
+    """配信する area.json と予報の本文を用意する
+
+    scale が2以上なら、既存の府県予報区を複製した "{コード}-{番号}" の地域を追加する。
+    """
+    with open(area_json, 'r', encoding='utf-8') as f:
+        area = json.load(f)
+
+    forecasts = {}
+    for path in sorted(glob.glob(os.path.join(forecast_dir, "*.json"))):
+        code = os.path.splitext(os.path.basename(path))[0]
+        if code.isdigit():
+            with open(path, 'rb') as f:
+                forecasts[code] = f.read()
+
+    if scale > 1:
+        for center in area['centers'].values():
+            originals = list(center['children'])
+            for k in range(1, scale):
+                for code in originals:
+                    synthetic = f"{code}-{k}"
+                    center['children'].append(synthetic)
+                    office = dict(area['offices'].get(code, {}))
+                    office['name'] = f"{office.get('name', code)} #{k}"
+                    area['offices'][synthetic] = office
+                    if code in forecasts:
+                        forecasts[synthetic] = forecasts[code]
+
+    area_body = json.dumps(area, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return area_body, forecasts
+
+
+class FixtureState:
+    """サーバー全体の設定とリクエスト数の集計"""
+
+    def __init__(self, area_body, forecasts, latency=0.0, jitter=0.0, error_rate=0.0, etag="content", seed=None):
+        self.area_body = area_body
+        self.forecasts = forecasts
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etag = etag
+        self.random = random.Random(seed)
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self.etags = {path: f'"{hashlib.sha1(body).hexdigest()}"' for path, body in self._bodies()}
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def _bodies(self):
+        yield AREA_PATH, self.area_body
+        for code, body in self.forecasts.items():
+            yield f"{FORECAST_PREFIX}{code}.json", body
+
+    def body_for(self, path):
+        if path == AREA_PATH:
+            return self.area_body
+        if path.startswith(FORECAST_PREFIX) and path.endswith(".json"):
+            return self.forecasts.get(path[len(FORECAST_PREFIX):-len(".json")])
+        return None
+
+    def etag_for(self, path):
+        if self.etag == "none":
+            return None
+        if self.etag == "always-new":
+            with self.lock:
+                return f'"{self.random.getrandbits(64):016x}"'
+        return self.etags.get(path)
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+            fail = self.random.random() < self.error_rate
+        return max(0.0, self.latency + jitter), fail
+
+    def count(self, status):
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-aliveを有効にする
+    state = None
+
+    def do_GET(self):
+        state = self.state
+        delay, fail = state.delay()
+        if delay:
+            time.sleep(delay)
+
+        path = self.path.split("?", 1)[0]
+        body = state.body_for(path)
+        if fail:
+            self._send(503, b"")
+            return
+        if body is None:
+            self._send(404, b"")
+            return
+
+        etag = state.etag_for(path)
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if etag:
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", headers)
+                return
+        else:
+            headers["Last-Modified"] = state.last_modified
+            if self.headers.get("If-Modified-Since") == state.last_modified:
+                self._send(304, b"", headers)
+                return
+        self._send(200, body, headers)
+
+    def _send(self, status, body, headers=None):
+        self.state.count(status)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 負荷をかけるとログが多すぎるので出さない
+        pass
+
+
+def serve(host, port, state):
+    handler = type("Handler", (FixtureHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="気象庁APIの代わりになるローカルサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--area-json", default="jma/area.json")
+    parser.add_argument("--forecast-dir", default="forecasts")
+    parser.add_argument("--latency", type=float, default=0.0, help="1リクエストごとの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のばらつき（±秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503を返す割合（0〜1）")
+    parser.add_argument("--etag", choices=ETAG_MODES, default="content",
+                        help="content: 内容のハッシュ / none: Last-Modifiedのみ / always-new: 毎回変える")
+    parser.add_argument("--scale", type=int, default=1, help="府県予報区を何倍に増やすか")
+    parser.add_argument("--seed", type=int, default=None, help="遅延とエラーの乱数の種")
+    args = parser.parse_args()
+
+    area_body, forecasts = build_fixtures(args.area_json, args.forecast_dir, args.scale)
+    state = FixtureState(
+        area_body, forecasts, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, etag=args.etag, seed=args.seed,
+    )
+    server = serve(args.host, args.port, state)
+    print(f"http://{args.host}:{args.port}/bosai で {len(forecasts)} 地域を配信します（Ctrl+Cで終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"応答数: {state.counts}")
+
+
+if __name__ == "__main__":
+    main()
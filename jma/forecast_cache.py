@@ -0,0 +1,94 @@
+import json
+import os
+
+# 府県予報区ごとのスナップショットを置くディレクトリ（forecasts/{code}.json）
+CACHE_DIR = "forecasts"
+
+
+class ForecastCache:
+    """forecasts/{code}.json をスナップショットとするHTTPキャッシュ
+
+    ETag・Last-Modified・reportDatetime は forecasts/{code}.meta.json に保存する。
+    利用側（aa.py・weather.py・temps.py）ごとに取り込み済みのreportDatetimeも記録し、
+    変化がなければ解析やDB書き込みを省略できるようにする。
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def snapshot_path(self, code):
+        return os.path.join(self.directory, f"{code}.json")
+
+    def meta_path(self, code):
+        return os.path.join(self.directory, f"{code}.meta.json")
+
+    def load_meta(self, code):
+        """メタ情報を読み込む（なければ空のdict）"""
+        try:
+            with open(self.meta_path(code), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, path, data):
+        # 書き込み途中のファイルを読まれないよう一時ファイルから置き換える
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def save_meta(self, code, meta):
+        self._write(self.meta_path(code), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    def conditional_headers(self, code):
+        """条件付きGETに使うヘッダーを返す（スナップショットがなければ空）"""
+        if not os.path.exists(self.snapshot_path(code)):
+            return {}
+        meta = self.load_meta(code)
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, code):
+        """スナップショットを読み込む"""
+        try:
+            with open(self.snapshot_path(code), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def store(self, code, content, data, etag=None, last_modified=None):
+        """取得した本文をスナップショットとして保存し、検証用ヘッダーを記録"""
+        self._write(self.snapshot_path(code), content)
+        meta = self.load_meta(code)
+        meta.update({
+            "etag": etag,
+            "last_modified": last_modified,
+            "reportDatetime": report_datetime(data),
+        })
+        self.save_meta(code, meta)
+
+    def is_ingested(self, code, consumer):
+        """利用側が最新のreportDatetimeを取り込み済みかどうか"""
+        meta = self.load_meta(code)
+        latest = meta.get("reportDatetime")
+        return latest is not None and meta.get("ingested", {}).get(consumer) == latest
+
+    def mark_ingested(self, code, consumer):
+        """利用側が最新のreportDatetimeを取り込んだことを記録"""
+        meta = self.load_meta(code)
+        meta.setdefault("ingested", {})[consumer] = meta.get("reportDatetime")
+        self.save_meta(code, meta)
+
+
+def report_datetime(data):
+    """予報JSONから最新のreportDatetimeを取り出す"""
+    if isinstance(data, dict):
+        data = [data]
+    values = [forecast.get("reportDatetime") for forecast in data or [] if isinstance(forecast, dict)]
+    values = [value for value in values if value]
+    return max(values) if values else None
@@ -0,0 +1,59 @@
+# 予報JSONを府県予報区ごとの列形式に正規化する
+#
+# 日付軸（timeDefines）に揃えた配列を持つdictを作っておけば、
+# 地域を選択したときはdictを引いて配列を参照するだけで済む。
+
+# 値がないときの表示
+MISSING = "データなし"
+
+# 気温の列（最低・最高とその上限・下限）
+TEMP_KEYS = (
+    "tempsMin", "tempsMinUpper", "tempsMinLower",
+    "tempsMax", "tempsMaxUpper", "tempsMaxLower",
+)
+
+
+def normalize_forecast(office_code, forecasts):
+    """1地域分の予報JSONを日付軸に揃えた列のdictに変換（データがなければNone）"""
+    if not forecasts:
+        return None
+
+    # 最も長いtimeDefinesを持つtimeSeriesを日付軸にする
+    best_time_series = max(
+        (ts for forecast in forecasts for ts in forecast.get('timeSeries', [])),
+        key=lambda ts: len(ts.get('timeDefines', [])),
+        default=None
+    )
+    if not best_time_series:
+        return None
+
+    time_defines = list(best_time_series.get('timeDefines', []))
+    position = {time_define: i for i, time_define in enumerate(time_defines)}
+    columns = {
+        'officeCode': office_code,
+        'reportDatetime': max((f.get('reportDatetime', '') for f in forecasts), default=''),
+        'timeDefines': time_defines,
+        'weatherCodes': [MISSING] * len(time_defines),
+    }
+    for key in TEMP_KEYS:
+        columns[key] = [MISSING] * len(time_defines)
+
+    # 各timeSeriesの値を日付軸の位置に1回だけ書き込む
+    for forecast in forecasts:
+        for ts in forecast.get('timeSeries', []):
+            indexes = [position.get(time_define) for time_define in ts.get('timeDefines', [])]
+            areas = ts.get('areas', [])
+            for area in areas:
+                if area.get('area', {}).get('code') == office_code and 'weatherCodes' in area:
+                    _fill(columns['weatherCodes'], indexes, area['weatherCodes'])
+            # 地点が複数ある府県予報区は、jmaII と同じく先頭の代表地点の気温を使う
+            if areas and ('tempsMin' in areas[0] or 'tempsMax' in areas[0]):
+                for key in TEMP_KEYS:
+                    _fill(columns[key], indexes, areas[0].get(key, []))
+    return columns
+
+
+def _fill(column, indexes, values):
+    for i, index in enumerate(indexes):
+        if index is not None:
+            column[index] = values[i] if i < len(values) else MISSING
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+
+# 全地域の天気予報スナップショット（1行1地域のNDJSON、索引は .idx.json）
+SNAPSHOT_PATH = "jma/all_forecasts.ndjson"
+
+# 索引とスナップショットが食い違ったときに索引を読み直す回数と間隔（秒）
+READ_RETRIES = 3
+RETRY_DELAY = 0.01
+
+
+def index_path_for(path):
+    """スナップショットに対応する索引ファイルのパス"""
+    root, _ = os.path.splitext(path)
+    return f"{root}.idx.json"
+
+
+class SnapshotWriter:
+    """地域ごとの予報を1行ずつ書き出すライター
+
+    1地域分ずつ書き込むので、全国分をメモリに持たずに済む。
+    closeした時点でスナップショットと索引を置き換える。
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.index_path = index_path_for(path)
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._index = {}
+
+    def write(self, code, data):
+        line = json.dumps([code, data], ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+        self._index[code] = [self._file.tell(), len(line)]
+        self._file.write(line)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        # 2つのファイルの置き換えの間をできるだけ短くするため、索引を書き終えてから置き換える。
+        # 間に読んだリーダーは古い索引で新しいファイルを読むが、食い違いに気づいて索引を読み直す
+        with open(f"{self.index_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, separators=(',', ':'))
+        os.replace(self._tmp_path, self.path)
+        os.replace(f"{self.index_path}.tmp", self.index_path)
+
+    def abort(self):
+        """書き込みを中断し、既存のスナップショットを残す"""
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, code):
+        return code in self._index
+
+
+class SnapshotReader:
+    """索引を使って1地域分だけを読み込むリーダー
+
+    all_forecasts.get(code, []) と同じ使い方ができる。
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self._index = self._load_index()
+
+    def _load_index(self):
+        with open(index_path_for(self.path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def __contains__(self, code):
+        return code in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def get(self, code, default=None):
+        for attempt in range(READ_RETRIES + 1):
+            entry = self._index.get(code)
+            if entry is None:
+                return default
+            offset, length = entry
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                line = f.read(length)
+            try:
+                found, data = json.loads(line)
+            except ValueError:
+                found = None
+            if found == code:
+                return data
+            # ファイルが置き換えられて索引の位置がずれたので、新しい索引を読み直す
+            if attempt:
+                time.sleep(RETRY_DELAY)
+            self._index = self._load_index()
+        return default
+
+    def __getitem__(self, code):
+        if code not in self._index:
+            raise KeyError(code)
+        return self.get(code)
+
+    def items(self):
+        """先頭から順に1地域ずつ読み出す"""
+        with open(self.path, 'rb') as f:
+            for line in f:
+                code, data = json.loads(line)
+                yield code, data
+
+
+def convert(json_path, path=SNAPSHOT_PATH):
+    """旧形式の all_forecasts.json をスナップショット形式に変換"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        all_forecasts = json.load(f)
+    with SnapshotWriter(path) as writer:
+        for code, data in all_forecasts.items():
+            writer.write(code, data)
+    return len(all_forecasts)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python jma/forecast_store.py jma/all_forecasts.json
+    source = sys.argv[1] if len(sys.argv) > 1 else "jma/all_forecasts.json"
+    print(f"{convert(source)} 地域を {SNAPSHOT_PATH} に変換しました")
@@ -0,0 +1,196 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 気象庁APIのベースURL（環境変数 JMA_BASE_URL か set_base_url() でローカルのサーバーに向けられる）
+DEFAULT_BASE_URL = "https://www.jma.go.jp/bosai"
+BASE_URL = os.environ.get("JMA_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+AREA_PATH = "/common/const/area.json"
+FORECAST_PATH_TEMPLATE = "/forecast/data/forecast/{area_code}.json"
+
+# 同時接続数・タイムアウト(秒)・リトライ回数・バックオフ(秒)の既定値
+MAX_WORKERS = 8
+TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+
+# リトライ対象のステータスコード
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# スレッドごとに1つのSessionを持たせる（requests.Sessionはスレッドセーフではない）
+_local = threading.local()
+
+
+def get_session(pool_size=MAX_WORKERS):
+    """keep-aliveで接続を使い回すSessionを返す"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def set_base_url(base_url):
+    """取得先のベースURLを切り替える（例: http://127.0.0.1:8000/bosai）"""
+    global BASE_URL
+    BASE_URL = base_url.rstrip("/")
+
+
+def area_url():
+    return BASE_URL + AREA_PATH
+
+
+def forecast_url(area_code):
+    return BASE_URL + FORECAST_PATH_TEMPLATE.format(area_code=area_code)
+
+
+def get(url, headers=None, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """URLにGETし、レスポンスを返す（失敗時は指数バックオフでリトライ）"""
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+            if response.status_code in RETRY_STATUS and attempt < retries:
+                raise requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            response.raise_for_status()
+            return response
+        except requests.RequestException as e:
+            # 404などリトライしても変わらないエラーはそのまま返す
+            status = e.response.status_code if e.response is not None else None
+            if attempt >= retries or (status is not None and status not in RETRY_STATUS):
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+def fetch_json(url, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """URLからJSONを取得"""
+    return get(url, timeout=timeout, retries=retries, backoff=backoff).json()
+
+
+def get_area_codes(area_data):
+    """area.jsonのcentersから府県予報区コードを抽出"""
+    area_codes = []
+    for center in area_data['centers'].values():
+        area_codes.extend(center['children'])
+    return area_codes
+
+
+def fetch_forecast(area_code, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """1つの地域コードの天気予報を取得し、(データ, 所要秒数)を返す"""
+    url = forecast_url(area_code)
+    start = time.perf_counter()
+    try:
+        data = fetch_json(url, timeout=timeout, retries=retries, backoff=backoff)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Failed to fetch data for area code {area_code}: {e}")
+        data = None
+    return data, time.perf_counter() - start
+
+
+def iter_forecasts(area_codes, max_workers=MAX_WORKERS, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """複数の地域コードの天気予報を並列に取得し、完了した順に(コード, データ, 所要秒数)を返す"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_forecast, code, timeout, retries, backoff): code
+            for code in area_codes
+        }
+        for future in as_completed(futures):
+            data, elapsed = future.result()
+            yield futures[future], data, elapsed
+
+
+def fetch_forecasts(area_codes, max_workers=MAX_WORKERS, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """複数の地域コードの天気予報を並列に取得し、(結果dict, 所要秒数dict)を返す"""
+    results = {}
+    latencies = {}
+    for code, data, elapsed in iter_forecasts(area_codes, max_workers, timeout, retries, backoff):
+        latencies[code] = elapsed
+        if data is not None:
+            results[code] = data
+    # 入力順を保つ
+    ordered = {code: results[code] for code in area_codes if code in results}
+    return ordered, latencies
+
+
+def refresh_forecast(area_code, cache, consumer, force=False, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """キャッシュを使って条件付きGETし、(状態, データ, 所要秒数)を返す
+
+    状態は "updated"（新しい内容）、"unchanged"（取り込み済みと同じ）、"failed" のいずれか。
+    unchanged の場合はスナップショットを解析せず、データはNoneになる。
+    """
+    url = forecast_url(area_code)
+    headers = {} if force else cache.conditional_headers(area_code)
+    start = time.perf_counter()
+    try:
+        response = get(url, headers=headers, timeout=timeout, retries=retries, backoff=backoff)
+        if response.status_code == 304:
+            if cache.is_ingested(area_code, consumer):
+                return "unchanged", None, time.perf_counter() - start
+            data = cache.load(area_code)
+        else:
+            data = response.json()
+            cache.store(
+                area_code, response.content, data,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            # 再配信されただけで発表時刻が変わっていなければ取り込み不要
+            if not force and cache.is_ingested(area_code, consumer):
+                return "unchanged", None, time.perf_counter() - start
+    except (requests.RequestException, ValueError) as e:
+        print(f"Failed to fetch data for area code {area_code}: {e}")
+        return "failed", None, time.perf_counter() - start
+    status = "updated" if data is not None else "failed"
+    return status, data, time.perf_counter() - start
+
+
+def iter_refresh_forecasts(area_codes, cache, consumer, force=False, max_workers=MAX_WORKERS,
+                           timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """複数の地域コードを並列に条件付き取得し、完了した順に(コード, 状態, データ, 所要秒数)を返す"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(refresh_forecast, code, cache, consumer, force, timeout, retries, backoff): code
+            for code in area_codes
+        }
+        for future in as_completed(futures):
+            status, data, elapsed = future.result()
+            yield futures[future], status, data, elapsed
+
+
+def refresh_forecasts(area_codes, cache, consumer, force=False, max_workers=MAX_WORKERS,
+                      timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """複数の地域コードを並列に条件付き取得し、(更新分dict, 変化なしlist, 所要秒数dict)を返す"""
+    updated = {}
+    unchanged = set()
+    latencies = {}
+    for code, status, data, latencies[code] in iter_refresh_forecasts(
+        area_codes, cache, consumer, force, max_workers, timeout, retries, backoff
+    ):
+        if status == "updated":
+            updated[code] = data
+        elif status == "unchanged":
+            unchanged.add(code)
+    ordered = {code: updated[code] for code in area_codes if code in updated}
+    return ordered, [code for code in area_codes if code in unchanged], latencies
+
+
+def latency_summary(latencies):
+    """地域ごとの所要時間の要約を文字列で返す"""
+    if not latencies:
+        return "取得対象がありません"
+    values = sorted(latencies.values())
+    slowest = max(latencies, key=latencies.get)
+    p50 = values[len(values) // 2]
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return (
+        f"{len(values)} 件: 平均 {sum(values) / len(values):.3f}s, "
+        f"p50 {p50:.3f}s, p95 {p95:.3f}s, "
+        f"最大 {values[-1]:.3f}s ({slowest})"
+    )
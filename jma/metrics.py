@@ -0,0 +1,247 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# 取得・取り込み・表示のよく通る処理の所要時間と件数を集める
+#
+#   with span("save_to_database"):      # 所要時間を記録
+#       ...
+#   @timed("get_weather_details")       # 関数全体を記録
+#   count("jma_fetch_total", status="updated")
+#
+# 環境変数で出力先を指定したときだけ書き出す（start_exporters() を呼んだプロセスのみ）。
+#
+#   METRICS_PORT=9100  http://127.0.0.1:9100/metrics でPrometheusのテキスト形式を返す
+#   METRICS_LOG=metrics.jsonl  区間ごとに1行のJSONを追記する
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_LOG = os.environ.get("METRICS_LOG")
+
+# JSONLに書き出す間隔（秒）と、書き出すまでにためておく区間の上限
+FLUSH_INTERVAL = 5
+MAX_PENDING = 10000
+
+# 所要時間のヒストグラムの区切り（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SPAN_METRIC = "jma_span_seconds"
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Metrics:
+    """区間の所要時間（ヒストグラム）とカウンターを保持する
+
+    Fletの画面は操作ごとに別スレッドから呼ばれるので、更新はロックの中で行う。
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.spans = {}
+        self.counters = {}
+        # JSONLに書き出す区間（log_path を指定したときだけためる）
+        self.log_path = None
+        self.pending = deque(maxlen=MAX_PENDING)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, name, seconds, labels=None, parent=None, started=None):
+        """区間の所要時間を1件記録する"""
+        key = (name, _label_key(labels or {}))
+        with self._lock:
+            stats = self.spans.get(key)
+            if stats is None:
+                stats = self.spans[key] = [0, 0.0, [0] * len(self.buckets)]
+            stats[0] += 1
+            stats[1] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats[2][i] += 1
+                    break
+            if self.log_path:
+                record = {"span": name, "start": started, "seconds": round(seconds, 6)}
+                if parent:
+                    record["parent"] = parent
+                if labels:
+                    record.update(labels)
+                self.pending.append(record)
+
+    def count(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def span(self, name, **labels):
+        return _Span(self, name, labels)
+
+    def summary(self):
+        """区間ごとの (回数, 合計秒数) を返す"""
+        with self._lock:
+            return {key: (stats[0], stats[1]) for key, stats in self.spans.items()}
+
+    def render_prometheus(self):
+        """Prometheusのテキスト形式"""
+        with self._lock:
+            spans = {key: (stats[0], stats[1], list(stats[2])) for key, stats in self.spans.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        if spans:
+            lines.append(f"# HELP {SPAN_METRIC} 処理ごとの所要時間")
+            lines.append(f"# TYPE {SPAN_METRIC} histogram")
+            for (name, labels), (total, seconds, bucket_counts) in sorted(spans.items()):
+                pairs = (("span", name),) + labels
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{SPAN_METRIC}_bucket{_format_labels(pairs + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{SPAN_METRIC}_bucket{_format_labels(pairs + (('le', '+Inf'),))} {total}")
+                lines.append(f"{SPAN_METRIC}_sum{_format_labels(pairs)} {seconds:.6f}")
+                lines.append(f"{SPAN_METRIC}_count{_format_labels(pairs)} {total}")
+
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """ためておいた区間をJSONLに追記する"""
+        path = self.log_path
+        if not path:
+            return 0
+        with self._lock:
+            records = list(self.pending)
+            self.pending.clear()
+        if records:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        return len(records)
+
+
+class _Span:
+    """with で囲んだ区間の所要時間を記録する（入れ子になった区間は親の名前も残す）"""
+
+    __slots__ = ("metrics", "name", "labels", "parent", "started", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        stack = getattr(self.metrics._local, "stack", None)
+        if stack is None:
+            stack = self.metrics._local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        self.metrics._local.stack.pop()
+        labels = dict(self.labels, error=exc_type.__name__) if exc_type else self.labels
+        self.metrics.observe(self.name, seconds, labels, self.parent, self.started)
+        return False
+
+
+# プロセスで1つの記録先
+metrics = Metrics()
+
+
+def span(name, **labels):
+    """with span("処理名"): で囲んだ区間の所要時間を記録する"""
+    return metrics.span(name, **labels)
+
+
+def timed(name=None):
+    """関数の所要時間を記録するデコレーター（名前を省略したら関数名）"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1, **labels):
+    """カウンターを増やす"""
+    metrics.count(name, value, **labels)
+
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def start_exporters(port=None, log_path=None):
+    """Prometheusのエンドポイントと、JSONLへの定期的な書き出しを始める（2回目以降は何もしない）"""
+    global _started
+    port = METRICS_PORT if port is None else port
+    log_path = log_path or METRICS_LOG
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+    if port:
+        # http.server は使うときだけ読み込む（アプリの起動を遅らせない）
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        except OSError as e:
+            # 同じポートを使うアプリを2つ起動したときなど。計測のためにアプリを止めない
+            logging.warning(f"メトリクスのポート {port} を開けませんでした: {e}")
+        else:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"メトリクス: http://127.0.0.1:{server.server_port}/metrics")
+
+    if log_path:
+        metrics.log_path = log_path
+
+        def flush_forever():
+            while True:
+                time.sleep(FLUSH_INTERVAL)
+                metrics.flush()
+
+        threading.Thread(target=flush_forever, name="metrics-flush", daemon=True).start()
+        # 終了時に残りを書き出す
+        atexit.register(metrics.flush)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from data_access import ForecastSnapshot, get_snapshot, load_area, swap_snapshot
+from forecast_cache import CACHE_DIR, ForecastCache
+from forecast_store import SNAPSHOT_PATH, SnapshotWriter
+from metrics import count, span
+
+# 予報を取り直す間隔（秒）。0（既定）なら取り直さない
+#
+# 取り直すとリポジトリにあるスナップショット・予報のJSON・weather.db を書き換え、jmaII では
+# 作業ディレクトリに archive.db も作るので、アプリを開いただけでは書き換えないように既定では止めておく。
+# 気象庁の発表は1日3回なので、使うときは JMA_REFRESH_INTERVAL=600（10分おき）で十分に追いつく。
+REFRESH_INTERVAL = float(os.environ.get("JMA_REFRESH_INTERVAL", 0))
+
+# キャッシュ上の利用者名（aa.py と同じスナップショットに書くので同じ名前を使う）
+CONSUMER = "aa"
+
+
+class Refresher:
+    """アプリのプロセス内で予報を定期的に取り直すバックグラウンド処理
+
+    refresh は変化した府県予報区コードの集合を返す関数で、取得から新しいデータの
+    組み立てと差し替えまでを行う。asyncioのループを専用のスレッドで動かし、
+    refresh と通知は別スレッドで実行するので、画面の操作が待たされることはない。
+    """
+
+    def __init__(self, refresh, interval=REFRESH_INTERVAL):
+        self.refresh = refresh
+        self.interval = interval
+        self.last_refresh = None
+        self._listeners = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._stopped = None
+
+    def start(self):
+        """バックグラウンドの更新を始める（2回目以降は何もしない）。始めたらTrue"""
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return False
+            self._thread = threading.Thread(
+                target=asyncio.run, args=(self._run(),), name="forecast-refresher", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    def subscribe(self, callback):
+        """更新があったときに callback(変化した地域コードの集合) を呼ぶ。登録を外す関数を返す
+
+        登録を外す関数はそのまま page.on_close に渡せる。
+        """
+        token = object()
+        with self._lock:
+            self._listeners[token] = callback
+
+        def unsubscribe(*args):
+            with self._lock:
+                self._listeners.pop(token, None)
+
+        return unsubscribe
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        while not self._stopped.is_set():
+            await self.refresh_now()
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh_now(self):
+        """1回取り直し、変化があれば登録された画面に知らせる"""
+        start = time.perf_counter()
+        try:
+            with span("refresh"):
+                changed = await asyncio.to_thread(self.refresh)
+        except Exception as e:
+            logging.warning(f"予報の更新に失敗しました: {e}")
+            count("jma_refresh_total", status="error")
+            return set()
+        count("jma_refresh_total", status="updated" if changed else "unchanged")
+        self.last_refresh = time.time()
+        if changed:
+            logging.info(f"{len(changed)} 地域の予報を更新しました（{time.perf_counter() - start:.2f}s）")
+            await self._notify(changed)
+        return changed
+
+    async def _notify(self, changed):
+        with self._lock:
+            listeners = list(self._listeners.items())
+        # 遅いセッションがほかを待たせないよう、それぞれ別スレッドで通知する
+        results = await asyncio.gather(
+            *(asyncio.to_thread(callback, changed) for _, callback in listeners),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                # 切断中のセッションは再接続すれば描き直せるので登録は残す（外すのはセッションが閉じたとき）
+                logging.warning(f"更新の通知に失敗しました: {result!r}")
+
+
+def refresh_snapshot_file(path=SNAPSHOT_PATH, cache_dir=CACHE_DIR, max_workers=None):
+    """更新された地域だけを取り直し、スナップショットを書き直して差し替える
+
+    新しいスナップショットは別スレッドで正規化まで済ませてから差し替えるので、
+    表示側はいつでも古いか新しいかのどちらか一方の完全なデータを見る。変化した地域コードの集合を返す。
+    """
+    # requests の読み込みは重いので、アプリの起動時ではなく最初の更新のときに行う
+    from jma_client import MAX_WORKERS, get_area_codes, iter_refresh_forecasts
+
+    if max_workers is None:
+        max_workers = MAX_WORKERS
+    area_codes = get_area_codes(load_area())
+    cache = ForecastCache(cache_dir)
+    current = get_snapshot(path) if os.path.exists(path) else None
+
+    updated = {}
+    with span("refresh_fetch"):
+        for code, status, data, _ in iter_refresh_forecasts(
+            area_codes, cache, CONSUMER, force=current is None, max_workers=max_workers
+        ):
+            count("jma_fetch_total", status=status, consumer=CONSUMER)
+            if status == "updated":
+                updated[code] = data
+    if not updated:
+        return set()
+
+    forecasts = {}
+    for code in area_codes:
+        data = updated.get(code) or (current.get(code) if current is not None else None)
+        if data:
+            forecasts[code] = data
+    with span("refresh_preload"):
+        snapshot = ForecastSnapshot(forecasts=forecasts).preload()
+
+    with span("refresh_write"):
+        with SnapshotWriter(path) as writer:
+            for code, data in forecasts.items():
+                writer.write(code, data)
+        swap_snapshot(snapshot, path)
+
+    for code in updated:
+        cache.mark_ingested(code, CONSUMER)
+    return set(updated)
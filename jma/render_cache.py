@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+from metrics import count
+
+# 詳細パネルの表示内容を地域と発表時刻ごとに覚えておく件数
+MAX_PANELS = 128
+
+
+class RenderCache:
+    """最近表示したパネルの内容を (府県予報区コード, 発表時刻) で引けるLRUキャッシュ
+
+    値はコントロールではなく、コントロールを作るための文字列などの組を入れる
+    （コントロールは1つの親にしか置けないが、組ならセッション間で共有できる）。
+    発表時刻がキーに入っているので、新しい予報を取り込めば自然に別のキーになる。
+    ヒット・ミス・追い出しの件数は metrics のカウンター（cache=name）にも数える。
+    """
+
+    def __init__(self, maxsize=MAX_PANELS, name="panel"):
+        self.maxsize = maxsize
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, build):
+        """key の内容を返す。なければ build() で作って覚える"""
+        with self._lock:
+            hit = key in self._entries
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = self._entries[key]
+            else:
+                self.misses += 1
+        if hit:
+            count("jma_render_cache_requests_total", cache=self.name, result="hit")
+            return value
+        count("jma_render_cache_requests_total", cache=self.name, result="miss")
+        value = build()
+        evicted = 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            count("jma_render_cache_evictions_total", evicted, cache=self.name, reason="size")
+        return value
+
+    def invalidate(self, office_code=None):
+        """office_code の内容を捨てる（省略時はすべて）。捨てた件数を返す"""
+        with self._lock:
+            if office_code is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                keys = [key for key in self._entries if key[0] == office_code]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+        if removed:
+            count("jma_render_cache_evictions_total", removed, cache=self.name, reason="invalidate")
+        return removed
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
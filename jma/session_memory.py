@@ -0,0 +1,143 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import tracemalloc
+
+from bench import load_app
+from data_access import get_area_index, get_snapshot
+from ui_metrics import iter_controls, records
+
+# Webモードで1セッションあたりに増えるメモリを測る
+#
+#   python jma/session_memory.py --sessions 100 --clicks 3
+#   python jma/session_memory.py --app jma/sub.py --budget-mb 512
+#   python jma/session_memory.py --save                # 結果を jma/session_memory.json に保存する
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_memory.json")
+
+_connection_class = None
+
+
+def new_page(session_id):
+    """何も送信しない接続につないだ ft.Page（コントロールの追加・更新は実際のセッションと同じに行う）"""
+    global _connection_class
+    from flet_core.page import Page
+
+    if _connection_class is None:
+        from flet_core.local_connection import LocalConnection
+        from flet_core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+        class NullConnection(LocalConnection):
+            """コマンドをページに反映するだけで、クライアントには送らない接続"""
+
+            def send_command(self, session_id, command):
+                result, _ = self._process_command(command)
+                return PageCommandResponsePayload(result=result, error="")
+
+            def send_commands(self, session_id, commands):
+                results = []
+                for command in commands:
+                    result, _ = self._process_command(command)
+                    if command.name in ("add", "get"):
+                        results.append(result)
+                return PageCommandsBatchResponsePayload(results=results, error="")
+
+        _connection_class = NullConnection
+    return Page(_connection_class(), session_id, loop=None)
+
+
+def find_tree(page):
+    """ページの中からサイドバーのAreaTreeViewを探す"""
+    for control in page.controls:
+        for current in iter_controls(control):
+            if hasattr(current.data, "tree"):
+                return current.data
+    return None
+
+
+def open_session(app, rng, clicks, session_id="session"):
+    """1セッションを開き、地方を開いて府県予報区を選ぶ操作を clicks 回行う"""
+    page = new_page(session_id)
+    app.main(page)
+    tree_view = find_tree(page)
+    tree = tree_view.tree
+    for _ in range(clicks):
+        center = rng.choice([row for row in tree.rows if row.depth == 0])
+        if not tree.is_expanded(center.level, center.code):
+            tree_view.on_click(center.level, center.code)
+        office = tree.rows[tree.position(center.level, center.code) + 1]
+        tree_view.on_click(office.level, office.code)
+    return page
+
+
+def measure(app_path, sessions, clicks, seed=0):
+    """(共有データのバイト数, 1セッションあたりのバイト数) を返す"""
+    app = load_app(app_path, "session_memory_app")
+    if app is None:
+        raise SystemExit("fletがインストールされていません")
+    # 計測中はネットワークに出ない
+    app.refresher.interval = 0
+    rng = random.Random(seed)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        get_area_index()
+        get_snapshot().preload()
+        # 全セッションで共有するキャッシュなどを先に温めておく
+        open_session(app, rng, clicks)
+        records.clear()
+        gc.collect()
+        shared = tracemalloc.get_traced_memory()[0] - start
+
+        before = tracemalloc.get_traced_memory()[0]
+        # 計測が終わるまでページを保持する
+        pages = [open_session(app, rng, clicks, f"session-{i}") for i in range(sessions)]
+        records.clear()
+        gc.collect()
+        per_session = (tracemalloc.get_traced_memory()[0] - before) / sessions
+    finally:
+        tracemalloc.stop()
+    return shared, per_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description="1セッションあたりのメモリ使用量を測る")
+    parser.add_argument("--app", default=os.path.join(ROOT, "jma", "main.py"))
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--clicks", type=int, default=3, help="1セッションで地域を選ぶ回数")
+    parser.add_argument("--budget-mb", type=float, default=None, help="このメモリで何セッション持てるかを計算する")
+    parser.add_argument("--save", action="store_true", help=f"結果を {os.path.relpath(RESULT_PATH, ROOT)} に保存する")
+    args = parser.parse_args()
+
+    shared, per_session = measure(args.app, args.sessions, args.clicks)
+    print(f"共有データ: {shared / 1024:.1f}KB")
+    print(f"1セッションあたり: {per_session / 1024:.1f}KB（{args.sessions} セッション、各 {args.clicks} 回選択）")
+    if args.budget_mb:
+        capacity = int((args.budget_mb * 1024 * 1024 - shared) // per_session) if per_session > 0 else 0
+        print(f"{args.budget_mb:.0f}MB で持てるセッション数: 約 {capacity}")
+    if args.save:
+        import flet_core.version
+
+        result = {
+            "app": os.path.relpath(os.path.abspath(args.app), ROOT),
+            "sessions": args.sessions,
+            "clicks": args.clicks,
+            "shared_kb": round(shared / 1024, 1),
+            "per_session_kb": round(per_session / 1024, 1),
+            "python": platform.python_version(),
+            "flet": flet_core.version.version,
+        }
+        with open(RESULT_PATH, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"結果を {RESULT_PATH} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# アプリの起動（コールドスタート）を区間ごとに計測する
+#
+#   python jma/startup_profile.py                          # 全アプリ
+#   python jma/startup_profile.py jma/main.py --runs 10
+#   python jma/startup_profile.py --budget-ms 1500         # 予算を超えたら終了コード1
+#   python jma/startup_profile.py --save-baseline          # 基準値を保存
+#   python jma/startup_profile.py --compare                # 基準値より遅くなっていれば終了コード1
+#
+# 1回ごとに新しいプロセスでアプリを読み込み、実際の ft.Page に送信しない接続をつないで
+# main(page) を呼ぶ。区間は次のとおり（すべてミリ秒）。
+#
+#   import_flet   fletの読み込み
+#   import_app    アプリのモジュールの読み込み（fletの後の import とモジュール直下の処理）
+#   data          main のうち startup.mark("data") までにかかった時間（地域の階層の読み込みなど）
+#   build         main のうちコントロールを組み立てた時間（data と first_update 以外）
+#   first_update  page.add・page.update の時間（送信するコマンドを作ってJSONにするまで）
+#   total         プロセスの起動から初回描画まで（インタープリタの起動を含む）
+#
+# Page と LocalConnection の内部（_process_command とコマンドの応答の形）に依存するので、
+# requirements.txt で固定している flet（FLET_VERSION）以外では結果を比べられない。
+# 基準値（startup_baseline.json）は次のように作り、"environment" に測った環境を残している。
+#
+#   pip install -r jma/requirements.txt -r jmaII/requirements.txt
+#   python jma/startup_profile.py --runs 5 --save-baseline
+#
+# 基準値は測ったマシンの速さに左右されるので、別の環境で --compare するときは先に保存し直す。
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+APPS = (
+    "calculator/calc.py",
+    "counter/main.py",
+    "hello-world/main.py",
+    "jma/main.py",
+    "jmaII/main.py",
+)
+PHASES = ("import_flet", "import_app", "data", "build", "first_update")
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+# 基準値からこの割合を超えて遅くなったら劣化とみなす
+TOLERANCE = 0.25
+# 計測が前提にしている flet のバージョン（各アプリの requirements.txt と同じ）
+FLET_VERSION = "0.22.1"
+# 基準値のファイルで、アプリの代わりに測った環境を入れるキー
+ENVIRONMENT_KEY = "environment"
+
+
+def profile_child(app_path):
+    """（計測用のプロセスの中で）アプリを1回起動し、区間ごとの秒数を返す"""
+    timings = {}
+    start = time.perf_counter()
+    import flet  # noqa: F401
+    from flet_core.local_connection import LocalConnection
+    from flet_core.page import Page
+    from flet_core.protocol import CommandEncoder, PageCommandResponsePayload, PageCommandsBatchResponsePayload
+    timings["import_flet"] = time.perf_counter() - start
+
+    class ProfileConnection(LocalConnection):
+        """コマンドをJSONにするところまで行い、送信はしない接続"""
+
+        def __init__(self):
+            super().__init__()
+            self.sent_bytes = 0
+
+        def _send(self, message):
+            if message:
+                self.sent_bytes += len(json.dumps(message, cls=CommandEncoder, separators=(",", ":")))
+
+        def send_command(self, session_id, command):
+            result, message = self._process_command(command)
+            self._send(message)
+            return PageCommandResponsePayload(result=result, error="")
+
+        def send_commands(self, session_id, commands):
+            results = []
+            for command in commands:
+                result, message = self._process_command(command)
+                if command.name in ("add", "get"):
+                    results.append(result)
+                self._send(message)
+            return PageCommandsBatchResponsePayload(results=results, error="")
+
+    # アプリのディレクトリにある共通モジュールを読み込めるようにする
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location("startup_profile_app", app_path)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    timings["import_app"] = time.perf_counter() - start
+
+    # page.add・page.update と startup.mark の時刻を記録し、あとで区間に振り分ける
+    events = []
+
+    def timed(method):
+        def wrapper(*args, **kwargs):
+            events.append(("update_start", time.perf_counter()))
+            try:
+                return method(*args, **kwargs)
+            finally:
+                events.append(("update_end", time.perf_counter()))
+        return wrapper
+
+    connection = ProfileConnection()
+    page = Page(connection, "profile", loop=None)
+    page.add = timed(page.add)
+    page.update = timed(page.update)
+    startup = getattr(app, "startup", None)
+    if startup is not None:
+        mark = startup.mark
+        startup.mark = lambda name: events.append((name, time.perf_counter())) or mark(name)
+        startup.report = lambda app_name="": None
+
+    start = time.perf_counter()
+    app.main(page)
+    end = time.perf_counter()
+    finished = time.time()
+
+    timings.update(data=0.0, build=0.0, first_update=0.0)
+    previous = start
+    pending = 0.0
+    for name, at in events:
+        if name == "update_end":
+            timings["first_update"] += at - previous
+        elif name == "data":
+            # 前の区切りから data までのうち、page.add 以外はデータの読み込み
+            timings["data"] += pending + at - previous
+            pending = 0.0
+        else:
+            pending += at - previous
+        previous = at
+    timings["build"] += pending + end - previous
+    # 親プロセスがこのプロセスを起動した時刻から数える
+    timings["total"] = finished - float(os.environ.get("STARTUP_PROFILE_LAUNCHED", finished))
+    timings["sent_kb"] = connection.sent_bytes / 1024
+    # アプリを動かした環境（--python で別のPythonを指定することもある）
+    from flet_core.version import version
+    timings["flet"] = version
+    timings["python"] = platform.python_version()
+    return timings
+
+
+def environment(results, runs):
+    """基準値と一緒に保存する、測った環境（アプリごとの結果から flet と python を取り除く）"""
+    found = {key: sorted({result.pop(key) for result in results.values()}) for key in ("python", "flet")}
+    return {
+        "python": ", ".join(found["python"]),
+        "flet": ", ".join(found["flet"]),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "runs": runs,
+    }
+
+
+def run_once(app_path, python=sys.executable):
+    """新しいプロセスで1回計測する"""
+    env = dict(os.environ)
+    # 計測中はバックグラウンドの更新を止める
+    env["JMA_REFRESH_INTERVAL"] = "0"
+    env.pop("STARTUP_LOG", None)
+    env["STARTUP_PROFILE_LAUNCHED"] = repr(time.time())
+    result = subprocess.run(
+        [python, os.path.abspath(__file__), "--child", app_path],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"{app_path} の計測に失敗しました:\n{result.stderr.strip()}")
+
+
+def profile(apps, runs=5, python=sys.executable):
+    """アプリごとに区間ごとの中央値（ミリ秒）を返す。最初の1回は .pyc とキャッシュを作るため捨てる"""
+    results = {}
+    for app_path in apps:
+        run_once(app_path, python)
+        samples = [run_once(app_path, python) for _ in range(runs)]
+        result = {
+            f"{name}_ms": round(statistics.median(sample[name] for sample in samples) * 1000, 2)
+            for name in PHASES + ("total",)
+        }
+        result["sent_kb"] = round(samples[-1]["sent_kb"], 1)
+        result["flet"] = samples[-1]["flet"]
+        result["python"] = samples[-1]["python"]
+        results[app_path] = result
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """基準値より遅くなったアプリを (アプリ, 基準値, 今回) で返す（total で比べる）"""
+    regressions = []
+    for app_path, result in results.items():
+        base = baseline.get(app_path, {}).get("total_ms")
+        if base and result["total_ms"] > base * (1 + tolerance):
+            regressions.append((app_path, base, result["total_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="アプリの起動時間を区間ごとに計測する")
+    parser.add_argument("apps", nargs="*", default=list(APPS), help="計測するアプリ（リポジトリのルートからのパス）")
+    parser.add_argument("--runs", type=int, default=5, help="アプリごとの計測回数")
+    parser.add_argument("--python", default=sys.executable, help="アプリを起動するPython（fletが入っているもの）")
+    parser.add_argument("--budget-ms", type=float, default=None, help="初回描画までの予算。超えたら終了コード1")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基準値のファイル")
+    parser.add_argument("--save-baseline", action="store_true", help="今回の結果を基準値として保存する")
+    parser.add_argument("--compare", action="store_true", help="基準値と比べ、劣化があれば終了コード1")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="劣化とみなす割合（0.25で25%%）")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if importlib.util.find_spec("flet") is None:
+            sys.exit("fletがインストールされていません")
+        print(json.dumps(profile_child(args.child)))
+        return
+
+    results = profile(args.apps, args.runs, args.python)
+    current = environment(results, args.runs)
+    if current["flet"] != FLET_VERSION:
+        print(f"注意: flet {current['flet']} で計測しました（前提は {FLET_VERSION}）。区間の振り分けが正しくない可能性があります")
+    print(f"{'app':<22}" + "".join(f"{name:>14}" for name in PHASES + ("total",)) + f"{'sent':>10}")
+    for app_path, result in results.items():
+        phases = "".join(f"{result[f'{name}_ms']:>12.1f}ms" for name in PHASES + ("total",))
+        print(f"{app_path:<22}{phases}{result['sent_kb']:>8.1f}KB")
+
+    failed = False
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        saved.update(results)
+        saved[ENVIRONMENT_KEY] = current
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(saved, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基準値を {args.baseline} に保存しました")
+
+    if args.compare:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        measured = baseline.get(ENVIRONMENT_KEY, {})
+        for key in ("python", "flet", "cpus"):
+            if measured.get(key) != current[key]:
+                print(f"注意: 基準値と {key} が違います（基準値 {measured.get(key)}, 今回 {current[key]}）")
+        regressions = compare(results, baseline, args.tolerance)
+        for app_path, base, current in regressions:
+            print(f"劣化: {app_path} total_ms {base} -> {current}")
+        failed = failed or bool(regressions)
+        if not regressions:
+            print("基準値からの劣化はありません")
+
+    if args.budget_ms is not None:
+        over = [(app_path, result["total_ms"]) for app_path, result in results.items() if result["total_ms"] > args.budget_ms]
+        for app_path, total in over:
+            print(f"予算超過: {app_path} {total:.1f}ms > {args.budget_ms:.0f}ms")
+        failed = failed or bool(over)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import json
+import os
+import time
+
+# 起動計測の結果を追記するファイル（環境変数で指定した場合のみ）
+STARTUP_LOG = os.environ.get("STARTUP_LOG")
+
+
+class StartupTimer:
+    """起動から初回描画までの経過時間を区間ごとに記録する"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []
+        self.reported = False
+
+    def mark(self, name):
+        """起動からの経過秒数を記録（報告したあと、2つ目以降のセッションでは記録しない）"""
+        elapsed = time.perf_counter() - self.start
+        if not self.reported:
+            self.marks.append((name, elapsed))
+        return elapsed
+
+    def as_dict(self):
+        return {name: round(elapsed, 4) for name, elapsed in self.marks}
+
+    def report(self, app_name=""):
+        """最初の1回だけ計測結果を出力する（2つ目以降のセッションは対象外）"""
+        if self.reported:
+            return
+        self.reported = True
+        summary = ", ".join(f"{name}: {elapsed * 1000:.1f}ms" for name, elapsed in self.marks)
+        print(f"起動時間 {app_name}: {summary}")
+        if STARTUP_LOG:
+            with open(STARTUP_LOG, 'a', encoding='utf-8') as f:
+                record = {"app": app_name, "time": time.time(), **self.as_dict()}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# アプリのモジュールで最初にimportしておく
+startup = StartupTimer()
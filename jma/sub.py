@@ -1,14 +1,22 @@
+from startup_timer import startup
+
 import flet as ft
-import json
 from datetime import datetime
 
-# JSONファイルの読み込み
-with open('jma/area.json', 'r', encoding='utf-8') as area_file:
-    region_data = json.load(area_file)
+from area_tree_view import AreaTreeView
+from data_access import get_area_index, get_forecast_columns, refresh_snapshot
+from metrics import start_exporters, timed
+from refresher import Refresher, refresh_snapshot_file
+from render_cache import RenderCache
+from ui_metrics import record_update
+
+startup.mark("import")
+
+# 表示内容は地域と発表時刻ごとに使い回す
+panel_cache = RenderCache()
 
-# all_forecasts.json ファイルの読み込み
-with open('jma/all_forecasts.json', 'r', encoding='utf-8') as forecast_file:
-    all_forecasts = json.load(forecast_file)
+# 予報をバックグラウンドで取り直し、スナップショットを差し替える（全セッションで1つ。JMA_REFRESH_INTERVAL を指定したときだけ）
+refresher = Refresher(refresh_snapshot_file)
 
 # ヘッダー
 def appbar(selected_region=None):
@@ -23,162 +31,143 @@ def appbar(selected_region=None):
 
 # サイドバー
 def sidebar(on_select_region):
-    region_list = []
-    for center_code, center_info in region_data['centers'].items():
-        region_list.append(
-            ft.ExpansionTile(
-                title=ft.Text(center_info["name"]),
-                subtitle=ft.Text(f"地域数: {len(center_info['children'])}"),
-                controls=[
-                    ft.Column(
-                        [
-                            ft.ListTile(
-                                title=ft.Text(get_region_name_by_code(region_code)),
-                                on_click=lambda e, region_code=region_code: on_select_region(region_code)
-                            )
-                            for region_code in center_info["children"]
-                        ]
-                    )
-                ],
-                initially_expanded=False
-            )
-        )
-    return ft.Column(
-        region_list,
-        spacing=10,
-        scroll=ft.ScrollMode.AUTO,
-        expand=True
-    )
+    # 展開した地域の子だけを作るツリー（地方 > 府県予報区 > 一次細分 > 市町村等まで）
+    return AreaTreeView(get_area_index(), on_select_region).view
 
 # 地域コードから地域名を取得
 def get_region_name_by_code(code):
-    for region_code, region_info in region_data['offices'].items():
-        if region_code == code:
-            return region_info["name"]
-    return None
+    return get_area_index().name(code, "offices")
 
 # 天気予報データを取得
+@timed()
 def get_weather_details(region_name, region_code):
-    region_forecasts = all_forecasts.get(region_code, [])
-    if not region_forecasts:
-        return None
-
-    # 最も長いtimeDefinesを持つtimeSeriesを探す
-    best_time_series = max(
-        (ts for forecast in region_forecasts for ts in forecast['timeSeries']),
-        key=lambda ts: len(ts.get('timeDefines', [])),
-        default=None
-    )
-    if not best_time_series:
-        return None
-
-    # 基本情報
-    time_defines = best_time_series.get('timeDefines', [])
-    weather_codes = ["データなし"] * len(time_defines)
-    temps_min = ["データなし"] * len(time_defines)
-    temps_max = ["データなし"] * len(time_defines)
-
-    # 各areaを探索
-    for forecast in region_forecasts:
-        for ts in forecast['timeSeries']:
-            for area in ts.get('areas', []):
-                area_code = area['area'].get('code', "")
-
-                # weatherCodesの取得
-                if area_code == region_code and 'weatherCodes' in area:
-                    weather_codes = area['weatherCodes']
-
-                # tempsMin/tempsMaxの取得
-                if 'tempsMin' in area or 'tempsMax' in area:
-                    for i, time_define in enumerate(ts.get('timeDefines', [])):
-                        if time_define in time_defines:
-                            index = time_defines.index(time_define)
-                            temps_min[index] = area.get('tempsMin', ["データなし"])[i]
-                            temps_max[index] = area.get('tempsMax', ["データなし"])[i]
-
-    return {
-        'timeDefines': time_defines,
-        'weatherCodes': weather_codes,
-        'tempsMin': temps_min,
-        'tempsMax': temps_max,
-    }
+    # 読み込み時に正規化済みの列をそのまま使う
+    return get_forecast_columns(region_code)
 
 # メイン処理
 def main(page: ft.Page):
     selected_region_name = None  # 選択中の地域名を保持
 
+    # ヘッダーとサイドバーは一度だけ作り、選択時は必要な部分だけを更新する
+    header = appbar(selected_region_name)
+    detail = ft.Column(
+        [ft.Text("地域を選択してください")],
+        expand=True,
+        scroll=ft.ScrollMode.AUTO
+    )
+
+    selected_code = None
+
+    @timed()
     def on_select_region(region_code):
-        nonlocal selected_region_name
+        nonlocal selected_region_name, selected_code
+        selected_code = region_code
+        # 新しいスナップショットが取り込まれていれば読み直し、古い表示内容を捨てる
+        if refresh_snapshot():
+            panel_cache.invalidate()
         selected_region_name = get_region_name_by_code(region_code)
         weather_details = get_weather_details(selected_region_name, region_code)
-        weather_info = format_weather_info(weather_details)
 
         # ヘッダーと表示を更新
-        page.controls = [
-            appbar(selected_region_name),
-            ft.Row([
-                sidebar(on_select_region),
-                ft.VerticalDivider(width=1),
-                ft.Column(
-                    weather_info,
-                    expand=True,
-                    scroll=ft.ScrollMode.AUTO
-                )
-            ], expand=True)
-        ]
-        page.update()
+        header.title.value = f"天気予報 - {selected_region_name}"
+        detail.controls = format_weather_info(weather_details)
+        page.update(header, detail)
+        record_update(region_code, page, header, detail)
+
+    def on_refreshed(changed_codes):
+        # 表示中の地域の予報が更新されたら描き直す
+        for code in changed_codes:
+            panel_cache.invalidate(code)
+        if selected_code in changed_codes:
+            on_select_region(selected_code)
+
+    # 再接続したセッションにも届くよう、切断ではなくセッションが閉じたときに登録を外す
+    page.on_close = refresher.subscribe(on_refreshed)
+
+    # 地域の階層を読み込む（2回目以降の起動はキャッシュから）
+    get_area_index()
+    startup.mark("data")
+
+    body = ft.Row([
+        sidebar(on_select_region),
+        ft.VerticalDivider(width=1),
+        detail
+    ], expand=True)
+    startup.mark("build")
 
     # 初期表示
-    page.add(
-        appbar(selected_region_name),
-        ft.Row([
-            sidebar(on_select_region),
-            ft.VerticalDivider(width=1),
-            ft.Column(
-                [ft.Text("地域を選択してください")],
-                expand=True,
-                scroll=ft.ScrollMode.AUTO
-            )
-        ], expand=True)
-    )
+    page.add(header, body)
 
-# 天気情報フォーマット
-def format_weather_info(weather_details):
-    if not weather_details:
-        return [ft.Text("天気情報がありません")]
+    # 初回描画までの時間を記録
+    startup.mark("first_paint")
+    startup.report("jma/sub")
+
+    # 予報の取り直し（requests などの読み込みを含む）は初回描画のあとで始める
+    refresher.start()
 
+# 天気情報フォーマット
+def panel_spec(weather_details):
+    """パネルに表示する (日付, 天気コード, 最低気温, 最高気温) の並びを作る"""
     time_defines = weather_details.get('timeDefines', [])
     weather_codes = weather_details.get('weatherCodes', [])
     temps_min = weather_details.get('tempsMin', [])
     temps_max = weather_details.get('tempsMax', [])
 
-    weather_info = []
+    rows = []
     for i, time_define in enumerate(time_defines):
         try:
             date = datetime.fromisoformat(time_define).strftime("%Y-%m-%d")
         except ValueError:
             date = time_define
 
+        rows.append((
+            date,
+            weather_codes[i] if i < len(weather_codes) else 'データなし',
+            temps_min[i] if i < len(temps_min) else 'データなし',
+            temps_max[i] if i < len(temps_max) else 'データなし',
+        ))
+    return tuple(rows)
+
+@timed()
+def format_weather_info(weather_details):
+    if not weather_details:
+        return [ft.Text("天気情報がありません")]
+
+    # 同じ地域・発表時刻なら日付の変換などは済んだものを使う
+    key = (weather_details.get('officeCode'), weather_details.get('reportDatetime'))
+    weather_info = []
+    for date, weather_code, temp_min, temp_max in panel_cache.get(key, lambda: panel_spec(weather_details)):
         weather_info.append(ft.Text(f"予報日時: {date}"))
-        weather_info.append(ft.Text(f"天気コード: {weather_codes[i] if i < len(weather_codes) else 'データなし'}"))
-        weather_info.append(ft.Text(f"最低気温: {temps_min[i] if i < len(temps_min) else 'データなし'}°C"))
-        weather_info.append(ft.Text(f"最高気温: {temps_max[i] if i < len(temps_max) else 'データなし'}°C"))
+        weather_info.append(ft.Text(f"天気コード: {weather_code}"))
+        weather_info.append(ft.Text(f"最低気温: {temp_min}°C"))
+        weather_info.append(ft.Text(f"最高気温: {temp_max}°C"))
         weather_info.append(ft.Text("---"))
     
     return weather_info
 
-ft.app(target=main)
+if __name__ == "__main__":
+    # METRICS_PORT・METRICS_LOG が指定されていれば計測結果を書き出す
+    start_exporters()
+    ft.app(target=main)
+from startup_timer import startup
+
 import flet as ft
-import json
 from datetime import datetime
 
-# JSONファイルの読み込み
-with open('jma/area.json', 'r', encoding='utf-8') as area_file:
-    region_data = json.load(area_file)
+from area_tree_view import AreaTreeView
+from data_access import get_area_index, get_forecast_columns, refresh_snapshot
+from metrics import start_exporters, timed
+from refresher import Refresher, refresh_snapshot_file
+from render_cache import RenderCache
+from ui_metrics import record_update
 
-# all_forecasts.json ファイルの読み込み
-with open('jma/all_forecasts.json', 'r', encoding='utf-8') as forecast_file:
-    all_forecasts = json.load(forecast_file)
+startup.mark("import")
+
+# 表示内容は地域と発表時刻ごとに使い回す
+panel_cache = RenderCache()
+
+# 予報をバックグラウンドで取り直し、スナップショットを差し替える（全セッションで1つ。JMA_REFRESH_INTERVAL を指定したときだけ）
+refresher = Refresher(refresh_snapshot_file)
 
 def appbar():
     return ft.AppBar(
@@ -190,83 +179,16 @@ def appbar():
     )
 
 def sidebar(on_select_region):
-    region_list = []
-    for center_code, center_info in region_data['centers'].items():
-        region_list.append(
-            ft.ExpansionTile(
-                title=ft.Text(center_info["name"]),
-                subtitle=ft.Text(f"地域数: {len(center_info['children'])}"),
-                controls=[
-                    ft.Column(
-                        [
-                            ft.ListTile(
-                                title=ft.Text(get_region_name_by_code(region_code)),
-                                on_click=lambda e, region_code=region_code: on_select_region(region_code)
-                            )
-                            for region_code in center_info["children"]
-                        ]
-                    )
-                ],
-                initially_expanded=False
-            )
-        )
-    return ft.Column(
-        region_list,
-        spacing=10,
-        scroll=ft.ScrollMode.AUTO,  # Columnにスクロールを設定
-        expand=True
-    )
+    # 展開した地域の子だけを作るツリー（地方 > 府県予報区 > 一次細分 > 市町村等まで）
+    return AreaTreeView(get_area_index(), on_select_region).view
 
 def get_region_name_by_code(code):
-    for region_code, region_info in region_data['offices'].items():
-        if region_code == code:
-            return region_info["name"]
-    return None
+    return get_area_index().name(code, "offices")
 
+@timed()
 def get_weather_details(region_name, region_code):
-    region_forecasts = all_forecasts.get(region_code, [])
-    if not region_forecasts:
-        return None
-
-    # 最も長いtimeDefinesを持つtimeSeriesを探す
-    best_time_series = max(
-        (ts for forecast in region_forecasts for ts in forecast['timeSeries']),
-        key=lambda ts: len(ts.get('timeDefines', [])),
-        default=None
-    )
-    if not best_time_series:
-        return None
-
-    # 基本情報
-    time_defines = best_time_series.get('timeDefines', [])
-    weather_codes = ["データなし"] * len(time_defines)
-    temps_min = ["データなし"] * len(time_defines)
-    temps_max = ["データなし"] * len(time_defines)
-
-    # 各areaを探索
-    for forecast in region_forecasts:
-        for ts in forecast['timeSeries']:
-            for area in ts.get('areas', []):
-                area_code = area['area'].get('code', "")
-
-                # weatherCodesの取得
-                if area_code == region_code and 'weatherCodes' in area:
-                    weather_codes = area['weatherCodes']
-
-                # tempsMin/tempsMaxの取得
-                if 'tempsMin' in area or 'tempsMax' in area:
-                    for i, time_define in enumerate(ts.get('timeDefines', [])):
-                        if time_define in time_defines:
-                            index = time_defines.index(time_define)
-                            temps_min[index] = area.get('tempsMin', ["データなし"])[i]
-                            temps_max[index] = area.get('tempsMax', ["データなし"])[i]
-
-    return {
-        'timeDefines': time_defines,
-        'weatherCodes': weather_codes,
-        'tempsMin': temps_min,
-        'tempsMax': temps_max,
-    }
+    # 読み込み時に正規化済みの列をそのまま使う
+    return get_forecast_columns(region_code)
 
 def get_weather_icon_and_description(weather_code):
     # 天気コードに対応するアイコンと説明を返す
@@ -301,27 +223,39 @@ def get_weather_icon_and_description(weather_code):
     
     return icon_description_map.get(str(weather_code), (ft.icons.WB_SUNNY, "不明"))
 
-def format_weather_info(weather_details):
-    if not weather_details:
-        return [ft.Text("天気情報がありません")]
-
+def panel_spec(weather_details):
+    """パネルに表示する (日付, アイコン, 説明, 最低気温, 最高気温) の並びを作る"""
     time_defines = weather_details.get('timeDefines', [])
     weather_codes = weather_details.get('weatherCodes', [])
     temps_min = weather_details.get('tempsMin', [])
     temps_max = weather_details.get('tempsMax', [])
 
-    weather_info = []
-    
+    rows = []
     for i, time_define in enumerate(time_defines):
         try:
             date = datetime.fromisoformat(time_define).strftime("%Y-%m-%d")
         except ValueError:
             date = time_define
 
-        weather_info.append(ft.Text(f"予報日時: {date}"))
-        
         # アイコンと説明文を取得
         icon, description = get_weather_icon_and_description(weather_codes[i])
+        rows.append((
+            date, icon, description,
+            temps_min[i] if i < len(temps_min) else '',
+            temps_max[i] if i < len(temps_max) else '',
+        ))
+    return tuple(rows)
+
+@timed()
+def format_weather_info(weather_details):
+    if not weather_details:
+        return [ft.Text("天気情報がありません")]
+
+    # 同じ地域・発表時刻なら日付の変換などは済んだものを使う
+    key = (weather_details.get('officeCode'), weather_details.get('reportDatetime'))
+    weather_info = []
+    for date, icon, description, temp_min, temp_max in panel_cache.get(key, lambda: panel_spec(weather_details)):
+        weather_info.append(ft.Text(f"予報日時: {date}"))
 
         # アイコンと説明文を表示
         weather_info.append(ft.Row([
@@ -329,8 +263,8 @@ def format_weather_info(weather_details):
             ft.Text(description, size=12)
         ]))
 
-        weather_info.append(ft.Text(f"最低気温: {temps_min[i] if i < len(temps_min) else ''}°C"))
-        weather_info.append(ft.Text(f"最高気温: {temps_max[i] if i < len(temps_max) else ''}°C"))
+        weather_info.append(ft.Text(f"最低気温: {temp_min}°C"))
+        weather_info.append(ft.Text(f"最高気温: {temp_max}°C"))
         weather_info.append(ft.Text("---"))
     
     return weather_info
@@ -341,44 +275,65 @@ def main(page: ft.Page):
     # 選択された地域名の初期状態
     selected_region = None
 
-    # 初期ヘッダーを設定
-    def update_header():
-        page.controls[0] = appbar(selected_region)
-        page.update()
+    # ヘッダーとサイドバーは一度だけ作り、選択時は必要な部分だけを更新する
+    header = appbar()
+    detail = ft.Column(
+        [ft.Text("天気予報:")],
+        expand=True,
+        scroll=ft.ScrollMode.AUTO
+    )
+
+    selected_code = None
 
     # 地域選択時の処理
+    @timed()
     def on_select_region(region_code):
-        nonlocal selected_region
+        nonlocal selected_region, selected_code
+        selected_code = region_code
+        # 新しいスナップショットが取り込まれていれば読み直し、古い表示内容を捨てる
+        if refresh_snapshot():
+            panel_cache.invalidate()
         selected_region = get_region_name_by_code(region_code)
-        update_header()
+        header.title.value = f"天気予報 - {selected_region}"
 
         weather_details = get_weather_details(selected_region, region_code)
-        weather_info = format_weather_info(weather_details)
-
-        page.controls[1] = ft.Row([
-            sidebar(on_select_region),
-            ft.VerticalDivider(width=1),
-            ft.Column(
-                weather_info,
-                expand=True,
-                scroll=ft.ScrollMode.AUTO
-            )
-        ], expand=True)
-        page.update()
+        detail.controls = format_weather_info(weather_details)
+        page.update(header, detail)
+        record_update(region_code, page, header, detail)
+
+    def on_refreshed(changed_codes):
+        # 表示中の地域の予報が更新されたら描き直す
+        for code in changed_codes:
+            panel_cache.invalidate(code)
+        if selected_code in changed_codes:
+            on_select_region(selected_code)
+
+    # 再接続したセッションにも届くよう、切断ではなくセッションが閉じたときに登録を外す
+    page.on_close = refresher.subscribe(on_refreshed)
+
+    # 地域の階層を読み込む（2回目以降の起動はキャッシュから）
+    get_area_index()
+    startup.mark("data")
+
+    body = ft.Row([
+        sidebar(on_select_region),
+        ft.VerticalDivider(width=1),
+        detail
+    ], expand=True)
+    startup.mark("build")
 
     # 初期表示
-    page.add(appbar())
-    first_center = list(region_data['centers'].values())[0]
-    page.add(
-        ft.Row([
-            sidebar(on_select_region),
-            ft.VerticalDivider(width=1),
-            ft.Column(
-                [ft.Text("天気予報:")],
-                expand=True,
-                scroll=ft.ScrollMode.AUTO
-            )
-        ], expand=True)
-    )
+    page.add(header)
+    page.add(body)
+
+    # 初回描画までの時間を記録
+    startup.mark("first_paint")
+    startup.report("jma/sub")
+
+    # 予報の取り直し（requests などの読み込みを含む）は初回描画のあとで始める
+    refresher.start()
 
-ft.app(target=main)
+if __name__ == "__main__":
+    # METRICS_PORT・METRICS_LOG が指定されていれば計測結果を書き出す
+    start_exporters()
+    ft.app(target=main)
@@ -0,0 +1,128 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# ベンチマーク用に、area.json と気象庁の予報JSONと同じ形のデータを作る
+
+JST = timezone(timedelta(hours=9))
+WEATHER_CODES = ("100", "101", "110", "200", "201", "202", "203", "211", "212", "300", "302", "313", "400", "402")
+RELIABILITIES = ("A", "B", "C")
+
+
+def make_area(centers=11, offices_per_center=6, class10_per_office=3, class15_per_class10=3, class20_per_class15=5):
+    """area.json と同じ階層のデータを作る
+
+    既定値では府県予報区66・class20が約3,000になり、実データ（58・1,787）を上回る。
+    """
+    area = {"centers": {}, "offices": {}, "class10s": {}, "class15s": {}, "class20s": {}}
+    for c in range(centers):
+        center_code = f"01{c + 1:02d}00"
+        center = {"name": f"地方{c + 1}", "enName": f"Center {c + 1}", "officeName": "", "children": []}
+        area["centers"][center_code] = center
+        for o in range(offices_per_center):
+            office_code = f"{c + 1:02d}{o:02d}00"
+            center["children"].append(office_code)
+            office = {"name": f"地域{c + 1}-{o}", "enName": "", "officeName": "", "parent": center_code, "children": []}
+            area["offices"][office_code] = office
+            for k in range(class10_per_office):
+                class10_code = f"{c + 1:02d}{o:02d}{k + 1:02d}"
+                office["children"].append(class10_code)
+                class10 = {"name": f"{office['name']}-{k}", "enName": "", "parent": office_code, "children": []}
+                area["class10s"][class10_code] = class10
+                for m in range(class15_per_class10):
+                    class15_code = f"{class10_code}{m}"
+                    class10["children"].append(class15_code)
+                    class15 = {"name": f"{class10['name']}-{m}", "enName": "", "parent": class10_code, "children": []}
+                    area["class15s"][class15_code] = class15
+                    for n in range(class20_per_class15):
+                        class20_code = f"{class15_code}{n:02d}"
+                        class15["children"].append(class20_code)
+                        area["class20s"][class20_code] = {
+                            "name": f"{class15['name']}-{n}", "enName": "", "kana": "", "parent": class15_code,
+                        }
+    return area
+
+
+def office_codes(area):
+    """centers の children を順に並べた府県予報区コード"""
+    return [code for center in area["centers"].values() for code in center["children"]]
+
+
+def make_forecast(office_code, report_datetime, horizon=7, areas=3, stations=4, rng=None):
+    """気象庁の forecast/{code}.json と同じ形の予報を作る（[短期, 週間]）"""
+    rng = rng or random.Random(office_code)
+    start = report_datetime.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    days = [(start + timedelta(days=i)).isoformat() for i in range(horizon)]
+    area_codes = [office_code] + [f"{office_code[:4]}{k + 1:02d}" for k in range(areas - 1)]
+    station_codes = [f"{office_code[:2]}{k:03d}" for k in range(stations)]
+
+    def temps():
+        low = [round(rng.uniform(-10, 20)) for _ in days]
+        high = [t + round(rng.uniform(2, 12)) for t in low]
+        return low, high
+
+    short = {
+        "publishingOffice": "気象庁",
+        "reportDatetime": report_datetime.isoformat(),
+        "timeSeries": [{
+            "timeDefines": [report_datetime.isoformat()] + days[:2],
+            "areas": [
+                {"area": {"name": code, "code": code}, "weatherCodes": [rng.choice(WEATHER_CODES) for _ in range(3)]}
+                for code in area_codes
+            ],
+        }],
+    }
+    weekly_temps = []
+    for code in station_codes:
+        low, high = temps()
+        weekly_temps.append({
+            "area": {"name": code, "code": code},
+            "tempsMin": [""] + [str(t) for t in low[1:]],
+            "tempsMinUpper": [""] + [str(t + 2) for t in low[1:]],
+            "tempsMinLower": [""] + [str(t - 2) for t in low[1:]],
+            "tempsMax": [""] + [str(t) for t in high[1:]],
+            "tempsMaxUpper": [""] + [str(t + 2) for t in high[1:]],
+            "tempsMaxLower": [""] + [str(t - 2) for t in high[1:]],
+        })
+    weekly = {
+        "publishingOffice": "気象庁",
+        "reportDatetime": report_datetime.isoformat(),
+        "timeSeries": [
+            {
+                "timeDefines": days,
+                "areas": [{
+                    "area": {"name": office_code, "code": office_code},
+                    "weatherCodes": [rng.choice(WEATHER_CODES) for _ in days],
+                    "pops": [""] + [str(rng.randrange(0, 100, 10)) for _ in days[1:]],
+                    "reliabilities": ["", ""] + [rng.choice(RELIABILITIES) for _ in days[2:]],
+                }],
+            },
+            {"timeDefines": days, "areas": weekly_temps},
+        ],
+        "tempAverage": {"areas": [
+            {"area": {"name": code, "code": code}, "min": "5.0", "max": "15.0"} for code in station_codes
+        ]},
+    }
+    return [short, weekly]
+
+
+def make_forecasts(area, report_datetime=None, horizon=7, seed=0):
+    """全府県予報区の予報を {コード: 予報} で作る"""
+    report_datetime = report_datetime or datetime(2024, 12, 2, 17, tzinfo=JST)
+    rng = random.Random(seed)
+    return {
+        code: make_forecast(code, report_datetime, horizon=horizon, rng=rng)
+        for code in office_codes(area)
+    }
+
+
+def iter_history(codes, days=365, reports_per_day=3, horizon=7, end=None, seed=0):
+    """過去days日分の発表を (コード, 予報) の順に返す（アーカイブの深さの確認用）"""
+    end = end or datetime(2024, 12, 2, 17, tzinfo=JST)
+    rng = random.Random(seed)
+    hours = [5, 11, 17][:reports_per_day]
+    for day in range(days, 0, -1):
+        date = end - timedelta(days=day)
+        for hour in hours:
+            report_datetime = date.replace(hour=hour)
+            for code in codes:
+                yield code, make_forecast(code, report_datetime, horizon=horizon, rng=rng)
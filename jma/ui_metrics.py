@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+
+from metrics import count
+
+# UI_METRICS=1 のときだけ、操作ごとに更新したコントロール数とバイト数を記録する
+# （ページ全体をたどるので、ふだんは何もしない）
+UI_METRICS = os.environ.get("UI_METRICS", "") not in ("", "0")
+
+# 操作ごとの更新量の記録（直近のみ保持）
+MAX_RECORDS = 1000
+records = []
+
+
+def iter_controls(control):
+    """コントロールとその子孫を順に返す"""
+    stack = [control]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(current._get_children())
+
+
+def count_controls(*controls):
+    """コントロールツリーに含まれるコントロールの数"""
+    return sum(1 for control in controls for _ in iter_controls(control))
+
+
+def _describe(control):
+    # 送信される内容の大きさを見積もるための簡易表現（種類・主な値・子）
+    spec = {"t": control._get_control_name()}
+    for attr in ("value", "name", "text"):
+        value = getattr(control, attr, None)
+        if isinstance(value, (str, int, float)):
+            spec[attr] = value
+    children = control._get_children()
+    if children:
+        spec["c"] = [_describe(child) for child in children]
+    return spec
+
+
+def estimate_bytes(*controls):
+    """コントロールツリーを送るときのおおよそのバイト数"""
+    return sum(
+        len(json.dumps(_describe(control), ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        for control in controls
+    )
+
+
+def record_update(name, page, *controls):
+    """1回の操作で更新したコントロール数・バイト数をページ全体と比べて記録する（UI_METRICS のときだけ）"""
+    if not UI_METRICS:
+        return None
+    record = {
+        "interaction": name,
+        "controls": count_controls(*controls),
+        "bytes": estimate_bytes(*controls),
+        "page_controls": count_controls(*page.controls),
+    }
+    records.append(record)
+    del records[:-MAX_RECORDS]
+    count("jma_ui_updates_total")
+    count("jma_ui_updated_controls_total", record["controls"])
+    count("jma_ui_updated_bytes_total", record["bytes"])
+    logging.info(
+        f"更新 {name}: {record['controls']} コントロール (約 {record['bytes']} bytes) "
+        f"/ ページ全体 {record['page_controls']} コントロール"
+    )
+    return record
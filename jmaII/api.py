@@ -0,0 +1,332 @@
+import os
+import sys
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlsplit
+
+# jma/ 配下の共通モジュールを読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jma'))
+
+from area_cache import load_area
+from area_index import LEVELS, AreaIndex
+from data_access import AREA_PATH
+from weather_db import DB_FILE, WeatherDB
+
+# weather.db の予報を返すHTTP/JSON API（Flet の画面と同じデータを使う）
+#
+#   python jmaII/api.py --port 8080
+#   curl --compressed http://127.0.0.1:8080/api/forecasts/130000
+#
+#   GET /api/regions/{code}[?level=offices]  地域の名前・親・子
+#   GET /api/forecasts/{office_code}         府県予報区の日ごとの天気と気温
+#   GET /api/forecasts                       全国分
+#   GET /api/health                          スナップショットの版と作成時刻
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# weather.db を読み直す間隔（秒）
+RELOAD_INTERVAL = 30
+# これより小さい本文は圧縮しない
+GZIP_MIN_SIZE = 256
+# リクエストヘッダーの上限
+MAX_HEADER_BYTES = 16 * 1024
+# 読み捨てるリクエスト本文の上限（これより大きければ応答後に接続を閉じる）
+MAX_BODY_BYTES = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+}
+
+
+class Body:
+    """1つの応答の本文（圧縮したものも作っておく）"""
+
+    __slots__ = ("raw", "gzipped")
+
+    def __init__(self, value):
+        self.raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzipped = gzip.compress(self.raw, compresslevel=6) if len(self.raw) >= GZIP_MIN_SIZE else None
+
+
+def region_entry(index, code, level):
+    parent = index.parent(code, level)
+    return {
+        "code": code,
+        "level": level,
+        "name": index.name(code, level),
+        "parent": {"level": parent[0], "code": parent[1]} if parent else None,
+        "children": [{"level": child_level, "code": child} for child_level, child in index.children(code, level)],
+    }
+
+
+def forecast_entry(index, office_code, rows):
+    return {
+        "officeCode": office_code,
+        "name": index.name(office_code, "offices"),
+        "days": [
+            {"date": date, "weatherCode": weather_code, "tempsMin": temps_min, "tempsMax": temps_max}
+            for date, weather_code, temps_min, temps_max in rows
+        ],
+    }
+
+
+class ApiSnapshot:
+    """ある時点のすべての応答を作っておいたもの（作ったあとは変更しない）
+
+    版は地域の階層と予報の内容から決まり、どちらかが変わったときだけ変わる。
+    ETag は版と本文の符号化（圧縮の有無）ごとに別の値にする。
+    """
+
+    def __init__(self, index, forecasts):
+        self.created = formatdate(usegmt=True)
+        self.bodies = {}
+        digest = hashlib.sha1()
+        # 同じコードが複数の階層にあるときは、階層を省略したら上位の階層を返す
+        for level in reversed(LEVELS):
+            for code in index.codes(level):
+                body = Body(region_entry(index, code, level))
+                digest.update(body.raw)
+                self.bodies[("regions", code, level)] = body
+                self.bodies[("regions", code, None)] = body
+
+        nationwide = {}
+        for office_code, rows in forecasts.items():
+            nationwide[office_code] = forecast_entry(index, office_code, rows)
+            self.bodies[("forecasts", office_code, None)] = Body(nationwide[office_code])
+        bulk = Body(nationwide)
+        digest.update(bulk.raw)
+        self.bodies[("forecasts", None, None)] = bulk
+
+        self.version = digest.hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+        self.gzip_etag = f'"{self.version}-gzip"'
+        self.bodies[("health", None, None)] = Body({"version": self.version, "created": self.created})
+
+    def get(self, resource, code=None, level=None):
+        return self.bodies.get((resource, code, level))
+
+
+def build_snapshot(db_file=DB_FILE, area_path=AREA_PATH):
+    """weather.db と area.json からすべての応答を作る（別スレッドで呼ぶ）"""
+    index = AreaIndex(load_area(area_path))
+    db = WeatherDB(db_file)
+    try:
+        forecasts = {}
+        for office_code in index.codes("offices"):
+            rows = db.fetch_forecast(office_code)
+            if rows:
+                forecasts[office_code] = rows
+    finally:
+        db.close()
+    return ApiSnapshot(index, forecasts)
+
+
+def accepts_gzip(accept_encoding):
+    """Accept-Encoding で gzip が受け入れられているか（q=0 は受け入れない）"""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match のいずれかの値（弱いETagを含む）が etag と一致するか"""
+    if if_none_match.strip() == "*":
+        return True
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == etag:
+            return True
+    return False
+
+
+def route(target):
+    """リクエストのパスを (リソース, コード, 階層) にする（対応しなければNone）"""
+    parts = urlsplit(target)
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if len(segments) < 2 or segments[0] != "api" or len(segments) > 3:
+        return None
+    resource = segments[1]
+    code = segments[2] if len(segments) == 3 else None
+    level = parse_qs(parts.query).get("level", [None])[0]
+    if resource == "regions" and code is not None:
+        return resource, code, level
+    if resource == "forecasts" and level is None:
+        return resource, code, None
+    if resource == "health" and code is None and level is None:
+        return resource, None, None
+    return None
+
+
+class ForecastApi:
+    """メモリ上のスナップショットから応答するasyncioのHTTPサーバー"""
+
+    def __init__(self, db_file=DB_FILE, area_path=AREA_PATH, reload_interval=RELOAD_INTERVAL):
+        self.db_file = db_file
+        self.area_path = area_path
+        self.reload_interval = reload_interval
+        self.snapshot = None
+        self.requests = 0
+
+    async def reload(self):
+        """別スレッドで応答を作り直し、内容が変わっていれば差し替える"""
+        start = time.perf_counter()
+        snapshot = await asyncio.to_thread(build_snapshot, self.db_file, self.area_path)
+        if self.snapshot is None or snapshot.version != self.snapshot.version:
+            self.snapshot = snapshot
+            logging.info(
+                f"スナップショット {snapshot.version} を読み込みました"
+                f"（{len(snapshot.bodies)} 件, {time.perf_counter() - start:.2f}s）"
+            )
+
+    async def _reload_forever(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                # 読み直しに失敗しても前のスナップショットで応答を続ける
+                logging.warning(f"スナップショットの読み直しに失敗しました: {e}")
+
+    def respond(self, method, target, headers):
+        """(ステータス, ヘッダー, 本文) を返す"""
+        if method not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, b""
+        key = route(target)
+        snapshot = self.snapshot
+        body = snapshot.get(*key) if key else None
+        if body is None:
+            return 404, {"Content-Type": "application/json; charset=utf-8"}, b'{"error":"not found"}'
+
+        gzipped = body.gzipped is not None and accepts_gzip(headers.get("accept-encoding", ""))
+        response_headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            # 圧縮した本文としない本文はバイト列が違うので別のETagにする
+            "ETag": snapshot.gzip_etag if gzipped else snapshot.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(headers.get("if-none-match", ""), response_headers["ETag"]):
+            return 304, response_headers, b""
+        if gzipped:
+            response_headers["Content-Encoding"] = "gzip"
+            return 200, response_headers, body.gzipped
+        return 200, response_headers, body.raw
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._write(writer, 400, {}, b"", keep_alive=False)
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self._write(writer, 400, {}, b"", keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                # 本文は使わないが、続くリクエストと取り違えないように読み捨てる
+                if not await self._discard_body(reader, headers):
+                    keep_alive = False
+
+                self.requests += 1
+                status, response_headers, body = self.respond(method, target, headers)
+                await self._write(writer, status, response_headers, b"" if method == "HEAD" else body,
+                                  keep_alive, content_length=len(body))
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def _discard_body(self, reader, headers):
+        """リクエストの本文を読み捨てる。接続を使い続けられなければFalse"""
+        if "transfer-encoding" in headers:
+            # chunked の本文は読み捨てずに、応答したら接続を閉じる
+            return False
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return False
+        if length < 0 or length > MAX_BODY_BYTES:
+            return False
+        if length:
+            try:
+                await reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return False
+        return True
+
+    async def _write(self, writer, status, headers, body, keep_alive, content_length=None):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        for name, value in headers.items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body) if content_length is None else content_length}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host, port):
+        await self.reload()
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+        reloader = asyncio.create_task(self._reload_forever())
+        logging.info(f"http://{host}:{port}/api で待ち受けています")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reloader.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="weather.db の予報を返すHTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=DB_FILE, help="読み込むデータベース")
+    parser.add_argument("--area-json", default=AREA_PATH, help="地域の階層を読むarea.json")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL, help="weather.dbを読み直す間隔（秒）")
+    args = parser.parse_args()
+
+    api = ForecastApi(args.db, args.area_json, args.reload_interval)
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
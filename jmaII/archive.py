@@ -0,0 +1,279 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import zlib
+from datetime import datetime, timedelta, timezone
+
+# 予報の履歴を残すデータベース
+ARCHIVE_FILE = "archive.db"
+
+# 発表時刻の表記に合わせる（気象庁の発表時刻は日本時間）
+JST = timezone(timedelta(hours=9))
+
+PAYLOADS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL
+) WITHOUT ROWID
+"""
+
+# 月ごとの表（reports_202412 など）。地域コードと発表時刻で引ける
+# report_times は本文から外した各ブロックの発表時刻（JSONの配列）
+REPORTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    office_code TEXT NOT NULL,
+    report_datetime TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    report_times TEXT,
+    PRIMARY KEY (office_code, report_datetime)
+) WITHOUT ROWID
+"""
+
+PARTITION_PATTERN = re.compile(r"reports_\d{6}")
+
+# 予報の内容が同じでも発表のたびに変わる項目（本文には入れず発表の記録に残す）
+REPORT_KEYS = ('reportDatetime',)
+
+
+def split_report_times(forecast_json):
+    """予報JSONを (発表時刻を除いた本文, ブロックごとの発表時刻) に分ける"""
+    blocks = []
+    times = []
+    for block in forecast_json:
+        blocks.append({key: value for key, value in block.items() if key not in REPORT_KEYS})
+        times.append({key: block[key] for key in REPORT_KEYS if key in block})
+    return blocks, times
+
+
+def content_hash(forecast_json):
+    """キーの順序や空白、発表時刻に左右されない内容のハッシュと、保存用の本文（発表時刻を除く）"""
+    blocks, _ = split_report_times(forecast_json)
+    body = json.dumps(blocks, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(body).hexdigest(), body
+
+
+def to_jst(value):
+    """ISO形式の日時を日本時間の文字列（発表時刻と同じ形式）にそろえる"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=JST)
+    return moment.astimezone(JST).isoformat()
+
+
+def partition_of(report_datetime):
+    """発表時刻から月の表の名前を返す（SQLに埋め込むので形を確かめる）"""
+    table = f"reports_{report_datetime[:4]}{report_datetime[5:7]}"
+    if not PARTITION_PATTERN.fullmatch(table):
+        raise ValueError(f"発表時刻の形式が正しくありません: {report_datetime!r}")
+    return table
+
+
+class ForecastArchive:
+    """地域コードと発表時刻をキーにした追記専用の予報アーカイブ
+
+    発表時刻だけが違う同じ内容の予報は本文を1つだけ保存し、発表の記録は月ごとの表に分ける。
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(PAYLOADS_SCHEMA)
+        self._partitions = set(self.partitions())
+        # 発表時刻を本文に含めていたころの表には report_times の列がない
+        for table in self._partitions:
+            columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if "report_times" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN report_times TEXT")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def partitions(self):
+        """月の表の名前（新しい順）"""
+        rows = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'reports\\_%' ESCAPE '\\'"
+        ).fetchall()
+        return sorted((row[0] for row in rows), reverse=True)
+
+    def _ensure_partition(self, table):
+        if table not in self._partitions:
+            self.conn.execute(REPORTS_SCHEMA.format(table=table))
+            self._partitions.add(table)
+
+    def add(self, office_code, forecast_json, fetched_at=None):
+        """1地域分の予報を追加（同じ発表時刻が既にあれば何もしない）。追加したらTrue"""
+        return self.add_many([(office_code, forecast_json)], fetched_at) > 0
+
+    def add_many(self, items, fetched_at=None):
+        """(地域コード, 予報JSON) の並びを1つのトランザクションで追加し、追加した件数を返す
+
+        発表時刻が読めない予報はログに残して飛ばす。
+        """
+        fetched_at = fetched_at or datetime.now(JST).isoformat(timespec='seconds')
+        added = 0
+        with self.conn:
+            for office_code, forecast_json in items:
+                try:
+                    report_datetime = max(
+                        (f.get('reportDatetime', '') for f in forecast_json), default=''
+                    )
+                    if not report_datetime:
+                        continue
+                    table = partition_of(report_datetime)
+                    digest, body = content_hash(forecast_json)
+                    _, times = split_report_times(forecast_json)
+                except (AttributeError, TypeError, ValueError) as e:
+                    # 1地域の予報が壊れていても、残りの地域はアーカイブする
+                    logging.warning(f"地域コード {office_code} の予報をアーカイブできませんでした: {e}")
+                    continue
+                self.conn.execute(
+                    "INSERT INTO payloads (hash, body) VALUES (?, ?) ON CONFLICT (hash) DO NOTHING",
+                    (digest, zlib.compress(body)),
+                )
+                self._ensure_partition(table)
+                cursor = self.conn.execute(
+                    f"INSERT INTO {table} (office_code, report_datetime, hash, fetched_at, report_times) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT (office_code, report_datetime) DO NOTHING",
+                    (office_code, report_datetime, digest, fetched_at, json.dumps(times, ensure_ascii=False)),
+                )
+                added += cursor.rowcount
+        return added
+
+    def _load(self, digest, report_times=None):
+        row = self.conn.execute("SELECT body FROM payloads WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        blocks = json.loads(zlib.decompress(row[0]))
+        # 本文から外した発表時刻を戻す（古い記録は本文に含んでいる）
+        if report_times:
+            for block, times in zip(blocks, json.loads(report_times)):
+                block.update(times)
+        return blocks
+
+    def as_of(self, office_code, moment):
+        """時刻momentの時点で発表済みだった最新の予報を (発表時刻, 予報JSON) で返す"""
+        moment = to_jst(moment)
+        target = partition_of(moment)
+        # momentの月から過去にさかのぼり、最初に見つかった月で決まる
+        for table in self.partitions():
+            if table > target:
+                continue
+            row = self.conn.execute(
+                f"SELECT report_datetime, hash, report_times FROM {table} "
+                "WHERE office_code = ? AND report_datetime <= ? "
+                "ORDER BY report_datetime DESC LIMIT 1",
+                (office_code, moment),
+            ).fetchone()
+            if row:
+                return row[0], self._load(row[1], row[2])
+        return None
+
+    def history(self, office_code, start, end):
+        """期間内の発表時刻の一覧（古い順）"""
+        start, end = to_jst(start), to_jst(end)
+        result = []
+        for table in sorted(self.partitions()):
+            if table < partition_of(start) or table > partition_of(end):
+                continue
+            result.extend(row[0] for row in self.conn.execute(
+                f"SELECT report_datetime FROM {table} "
+                "WHERE office_code = ? AND report_datetime BETWEEN ? AND ? ORDER BY report_datetime",
+                (office_code, start, end),
+            ))
+        return result
+
+    def compact(self, thin_after_months=3, drop_after_months=None, today=None):
+        """古い月を間引き、参照されない本文を消してファイルを詰める
+
+        thin_after_months より古い月は地域ごとに1日の最後の発表だけを残す。
+        drop_after_months を指定すると、それより古い月の表は削除する。
+        """
+        today = today or datetime.now(JST)
+        thin_before = partition_of(_months_ago(today, thin_after_months).isoformat())
+        drop_before = (
+            partition_of(_months_ago(today, drop_after_months).isoformat())
+            if drop_after_months is not None else None
+        )
+        removed = 0
+        with self.conn:
+            for table in self.partitions():
+                if drop_before and table < drop_before:
+                    removed += self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    self.conn.execute(f"DROP TABLE {table}")
+                    self._partitions.discard(table)
+                elif table < thin_before:
+                    removed += self.conn.execute(
+                        f"DELETE FROM {table} WHERE report_datetime < ("
+                        f"  SELECT MAX(t.report_datetime) FROM {table} AS t"
+                        f"  WHERE t.office_code = {table}.office_code"
+                        f"  AND substr(t.report_datetime, 1, 10) = substr({table}.report_datetime, 1, 10)"
+                        ")"
+                    ).rowcount
+            referenced = " UNION ".join(f"SELECT hash FROM {table}" for table in self.partitions())
+            if referenced:
+                self.conn.execute(f"DELETE FROM payloads WHERE hash NOT IN ({referenced})")
+            else:
+                self.conn.execute("DELETE FROM payloads")
+        self.conn.execute("VACUUM")
+        return removed
+
+
+def _months_ago(moment, months):
+    year, month = divmod(moment.year * 12 + moment.month - 1 - months, 12)
+    return moment.replace(year=year, month=month + 1, day=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="予報アーカイブの操作")
+    parser.add_argument("--db", default=ARCHIVE_FILE, help="アーカイブのデータベース")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("import", help="forecasts/{code}.json のスナップショットを取り込む")
+    load.add_argument("directory", nargs="?", default="forecasts")
+
+    as_of = commands.add_parser("as-of", help="ある時点で発表済みだった予報を表示する")
+    as_of.add_argument("office_code")
+    as_of.add_argument("moment", help="例: 2024-12-02T18:00")
+
+    compact = commands.add_parser("compact", help="古い月を間引いてファイルを詰める")
+    compact.add_argument("--thin-after", type=int, default=3, help="何か月より前を1日1件に間引くか")
+    compact.add_argument("--drop-after", type=int, default=None, help="何か月より前を削除するか")
+
+    args = parser.parse_args()
+    archive = ForecastArchive(args.db)
+    try:
+        if args.command == "import":
+            items = []
+            for path in sorted(glob.glob(os.path.join(args.directory, "*.json"))):
+                code = os.path.splitext(os.path.basename(path))[0]
+                if not code.isdigit():
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    items.append((code, json.load(f)))
+            print(f"{archive.add_many(items)} 件を追加しました（{len(items)} ファイル）")
+        elif args.command == "as-of":
+            found = archive.as_of(args.office_code, args.moment)
+            if found is None:
+                print("該当する予報はありません")
+            else:
+                report_datetime, forecast_json = found
+                print(f"発表時刻: {report_datetime}")
+                print(json.dumps(forecast_json, ensure_ascii=False, indent=2))
+        elif args.command == "compact":
+            removed = archive.compact(args.thin_after, args.drop_after)
+            print(f"{removed} 件の発表を削除しました")
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
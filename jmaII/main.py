@@ -1,14 +1,30 @@
+import os
+import sys
+
+# jma/ 配下の共通モジュールを読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jma'))
+
+from startup_timer import startup
+
 import flet as ft
-import json
 import sqlite3
 from datetime import datetime
 
-# SQLiteのデータベースファイルパス
-DB_FILE = "weather.db"
+from data_access import get_area_index, get_centers
+from metrics import start_exporters, timed
+from refresher import Refresher
+from ui_metrics import record_update
+from weather_db import DB_FILE, get_db
+
+startup.mark("import")
 
-# JSONファイルの読み込み
-with open('jma/area.json', 'r', encoding='utf-8') as area_file:
-    region_data = json.load(area_file)
+def run_pipeline():
+    # pipeline（requests を使う）は初回描画のあと、最初の取り込みのときに読み込む
+    from pipeline import run
+    return run(DB_FILE)
+
+# 予報をバックグラウンドでweather.dbに取り込む（WALなので表示中の読み取りは止まらない。全セッションで1つ。JMA_REFRESH_INTERVAL を指定したときだけ）
+refresher = Refresher(run_pipeline)
 
 def appbar():
     return ft.AppBar(
@@ -21,7 +37,7 @@ def appbar():
 
 def sidebar(on_select_region):
     region_list = []
-    for center_code, center_info in region_data['centers'].items():
+    for center_code, center_info in get_centers().items():
         region_list.append(
             ft.ExpansionTile(
                 title=ft.Text(center_info["name"]),
@@ -48,48 +64,32 @@ def sidebar(on_select_region):
     )
 
 def get_region_name_by_code(code):
-    for region_code, region_info in region_data['offices'].items():
-        if region_code == code:
-            return region_info["name"]
-    return None
+    return get_area_index().name(code, "offices")
 
+@timed()
 def get_weather_details(region_name, region_code):
     try:
-        connection = sqlite3.connect(DB_FILE)
-        cursor = connection.cursor()
-
         # weather_forecast と weekly_temp テーブルを結合してデータを取得
-        cursor.execute("""
-        SELECT f.forecast_date, f.weather_code, t.temps_min, t.temps_max
-        FROM weather_forecast AS f
-        JOIN weekly_temp AS t
-        ON f.area_code = t.area_code AND f.forecast_date = t.forecast_date
-        WHERE f.area_code = ?
-        ORDER BY f.forecast_date
-        """, (region_code,))
-        rows = cursor.fetchall()
-
-        if not rows:
-            return None
-
-        # データを整形
-        forecast_dates = [row[0] for row in rows]
-        weather_codes = [row[1] for row in rows]
-        temps_min = [row[2] for row in rows]  # 最低気温
-        temps_max = [row[3] for row in rows]  # 最高気温
-
-        return {
-            'timeDefines': forecast_dates,
-            'weatherCodes': weather_codes,
-            'tempsMin': temps_min,
-            'tempsMax': temps_max,
-        }
-
-    except Exception as e:
+        rows = get_db(DB_FILE).fetch_forecast(region_code)
+    except sqlite3.Error as e:
         print(f"Error fetching data from database: {e}")
         return None
-    finally:
-        connection.close()
+
+    if not rows:
+        return None
+
+    # データを整形
+    forecast_dates = [row[0] for row in rows]
+    weather_codes = [row[1] for row in rows]
+    temps_min = [row[2] for row in rows]  # 最低気温
+    temps_max = [row[3] for row in rows]  # 最高気温
+
+    return {
+        'timeDefines': forecast_dates,
+        'weatherCodes': weather_codes,
+        'tempsMin': temps_min,
+        'tempsMax': temps_max,
+    }
 
 def get_weather_icon_and_description(weather_code):
     # 天気コードに対応するアイコンと説明を返す
@@ -124,6 +124,7 @@ def get_weather_icon_and_description(weather_code):
     
     return icon_description_map.get(str(weather_code), (ft.icons.WB_SUNNY, "不明"))
 
+@timed()
 def format_weather_info(weekly_weather_forecast):
     if not weekly_weather_forecast:
         return [ft.Text("天気情報がありません")]
@@ -163,35 +164,54 @@ def main(page: ft.Page):
 
     page.add(appbar())
 
+    # サイドバーは一度だけ作り、選択時は右側の詳細だけを差し替える
+    detail = ft.Column(
+        [ft.Text("天気予報:")],
+        expand=True,
+        scroll=ft.ScrollMode.AUTO  # Columnにスクロールを設定
+    )
+
+    selected_code = None
+
+    @timed()
     def on_select_region(region_code):
+        nonlocal selected_code
+        selected_code = region_code
         region_name = get_region_name_by_code(region_code)
         weather_details = get_weather_details(region_name, region_code)
-        weather_info = format_weather_info(weather_details)
-
-        page.controls = [
-            ft.Row([
-                sidebar(on_select_region),
-                ft.VerticalDivider(width=1),
-                ft.Column(
-                    weather_info,
-                    expand=True,
-                    scroll=ft.ScrollMode.AUTO  # Columnにスクロールを設定
-                )
-            ], expand=True)
-        ]
-        page.update()
-
-    first_center = list(region_data['centers'].values())[0]
-    page.add(
-        ft.Row([
-            sidebar(on_select_region),
-            ft.VerticalDivider(width=1),
-            ft.Column(
-                [ft.Text("天気予報:")],
-                expand=True,
-                scroll=ft.ScrollMode.AUTO  # Columnにスクロールを設定
-            )
-        ], expand=True)
-    )
-
-ft.app(target=main)
+        detail.controls = format_weather_info(weather_details)
+        detail.update()
+        record_update(region_code, page, detail)
+
+    def on_refreshed(changed_codes):
+        # 表示中の地域の予報が取り込まれたら描き直す
+        if selected_code in changed_codes:
+            on_select_region(selected_code)
+
+    # 再接続したセッションにも届くよう、切断ではなくセッションが閉じたときに登録を外す
+    page.on_close = refresher.subscribe(on_refreshed)
+
+    # 地域の階層を読み込む（2回目以降の起動はキャッシュから）
+    get_area_index()
+    startup.mark("data")
+
+    body = ft.Row([
+        sidebar(on_select_region),
+        ft.VerticalDivider(width=1),
+        detail
+    ], expand=True)
+    startup.mark("build")
+
+    page.add(body)
+
+    # 初回描画までの時間を記録
+    startup.mark("first_paint")
+    startup.report("jmaII/main")
+
+    # 予報の取り直し（requests などの読み込みを含む）は初回描画のあとで始める
+    refresher.start()
+
+if __name__ == "__main__":
+    # METRICS_PORT・METRICS_LOG が指定されていれば計測結果を書き出す
+    start_exporters()
+    ft.app(target=main)
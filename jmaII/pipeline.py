@@ -0,0 +1,267 @@
+import os
+import sys
+import queue
+import threading
+import time
+import logging
+import argparse
+
+# jma/ 配下の共通モジュールを読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jma'))
+
+from archive import ARCHIVE_FILE, ForecastArchive
+from forecast_cache import CACHE_DIR, ForecastCache
+from jma_client import (
+    BASE_URL, MAX_WORKERS, area_url, fetch_json, get_area_codes,
+    iter_refresh_forecasts, latency_summary, set_base_url,
+)
+from metrics import count, metrics, span, start_exporters, timed
+from schema import PRUNE_TEMP, PRUNE_WEATHER, UPSERT_TEMP_DETAIL, UPSERT_WEATHER_DETAIL
+from temps import connect, create_table
+from weather import load_region_codes
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DB_FILE = "weather.db"
+AREA_JSON = "jmaII/area.json"
+CONSUMER = "pipeline"  # キャッシュ上の利用者名
+
+# 書き込みスレッドが1トランザクションにまとめる地域数
+BATCH_SIZE = 16
+# 取得側が先行しすぎないようにキューの長さを制限する
+QUEUE_SIZE = 64
+
+
+def _number(value, cast):
+    # 空文字は値なしとして扱う
+    try:
+        return cast(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _value(values, i):
+    return values[i] if i < len(values) else None
+
+
+@timed()
+def parse_forecast(office_code, forecast_json):
+    """予報JSONを1回走査して (天気の行, 気温の行) を返す
+
+    天気の行: (地域コード, 日付, 天気コード, 降水確率, 信頼度)
+    気温の行: (府県予報区コード, 日付, 最低, 最高, 最低の上限, 最低の下限, 最高の上限, 最高の下限)
+
+    想定と違う形のJSONなら ValueError を送出する。
+    """
+    try:
+        return _parse_forecast(office_code, forecast_json)
+    except (AttributeError, IndexError, KeyError, TypeError) as e:
+        raise ValueError(f"地域コード {office_code} の予報を解析できません: {e!r}") from e
+
+
+def _parse_forecast(office_code, forecast_json):
+    weather_rows = []
+    temps = {}
+    for forecast in forecast_json:
+        for series in forecast.get('timeSeries', []):
+            time_defines = series.get('timeDefines', [])
+            areas = series.get('areas', [])
+            for area in areas:
+                # 7日以上の天気（weather.py と同じ対象）
+                if len(time_defines) >= 7 and 'weatherCodes' in area:
+                    area_code = area.get('area', {}).get('code', '')
+                    weather_codes = area['weatherCodes']
+                    pops = area.get('pops', [])
+                    reliabilities = area.get('reliabilities', [])
+                    for i, date in enumerate(time_defines):
+                        weather_code = _value(weather_codes, i)
+                        if weather_code:  # 天気コードがない場合はスキップ
+                            weather_rows.append((
+                                area_code, date, weather_code,
+                                _number(_value(pops, i), int),
+                                _value(reliabilities, i) or None,
+                            ))
+            # 週間気温（temps.py と同じく、先頭の代表地点の値を府県予報区コードで保存）
+            if areas and ('tempsMin' in areas[0] or 'tempsMax' in areas[0]):
+                columns = [
+                    areas[0].get(key, []) for key in (
+                        'tempsMin', 'tempsMax',
+                        'tempsMinUpper', 'tempsMinLower', 'tempsMaxUpper', 'tempsMaxLower',
+                    )
+                ]
+                for i, date in enumerate(time_defines):
+                    temps[date] = (office_code, date) + tuple(
+                        _number(_value(values, i), float) for values in columns
+                    )
+    return weather_rows, list(temps.values())
+
+
+def _first_dates(rows):
+    first_dates = {}
+    for row in rows:
+        area_code, date = row[0], row[1]
+        first_dates[area_code] = min(date, first_dates.get(area_code, date))
+    return first_dates.items()
+
+
+class Writer(threading.Thread):
+    """キューから受け取った行をまとめて書き込む唯一のスレッド
+
+    archive_file を指定すると、取り込んだ予報をアーカイブにも追記する。
+    """
+
+    def __init__(self, db_file, cache, archive_file=None, batch_size=BATCH_SIZE):
+        super().__init__(name="weather-writer", daemon=True)
+        self.db_file = db_file
+        self.cache = cache
+        self.archive_file = archive_file
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.rows_written = 0
+        self.offices_written = 0
+        self.updated_codes = set()
+        self.reports_archived = 0
+        self.write_seconds = 0.0
+        self.error = None
+
+    def put(self, office_code, forecast_json, weather_rows, temp_rows):
+        self.queue.put((office_code, forecast_json, weather_rows, temp_rows))
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        if self.error:
+            raise self.error
+
+    def run(self):
+        connection = None
+        archive = None
+        try:
+            connection = connect(self.db_file)
+            if self.archive_file:
+                archive = ForecastArchive(self.archive_file)
+            batch = []
+            while True:
+                item = self.queue.get()
+                if item is not None:
+                    batch.append(item)
+                if batch and (item is None or len(batch) >= self.batch_size):
+                    self._write(connection, archive, batch)
+                    batch = []
+                if item is None:
+                    break
+        except Exception as e:
+            self.error = e
+            # 取得側が詰まらないように残りを読み捨てる
+            while self.queue.get() is not None:
+                pass
+        finally:
+            if connection is not None:
+                connection.close()
+            if archive is not None:
+                archive.close()
+
+    def _write(self, connection, archive, batch):
+        weather_rows = [row for _, _, rows, _ in batch for row in rows]
+        temp_rows = [row for _, _, _, rows in batch for row in rows]
+        start = time.perf_counter()
+        with span("pipeline_write"), connection:
+            connection.executemany(UPSERT_WEATHER_DETAIL, weather_rows)
+            connection.executemany(PRUNE_WEATHER, _first_dates(weather_rows))
+            connection.executemany(UPSERT_TEMP_DETAIL, temp_rows)
+            connection.executemany(PRUNE_TEMP, _first_dates(temp_rows))
+        if archive is not None:
+            with span("pipeline_archive"):
+                self.reports_archived += archive.add_many(
+                    (office_code, forecast_json) for office_code, forecast_json, _, _ in batch
+                )
+        self.write_seconds += time.perf_counter() - start
+        count("jma_rows_written_total", len(weather_rows), table="weather_forecast")
+        count("jma_rows_written_total", len(temp_rows), table="weekly_temp")
+        self.rows_written += len(weather_rows) + len(temp_rows)
+        self.offices_written += len(batch)
+        # コミットできた地域だけ取り込み済みにする
+        for office_code, _, _, _ in batch:
+            self.cache.mark_ingested(office_code, CONSUMER)
+            self.updated_codes.add(office_code)
+
+
+def run(db_file=DB_FILE, area_json=AREA_JSON, max_workers=MAX_WORKERS, archive_file=ARCHIVE_FILE,
+        cache_dir=CACHE_DIR, region_codes=None):
+    """全地域を1回ずつ取得し、天気と気温の両方のテーブルに取り込む。取り込んだ府県予報区コードの集合を返す"""
+    if region_codes is None:
+        region_codes = load_region_codes(area_json)
+
+    connection = connect(db_file)
+    try:
+        force = create_table(connection)
+    finally:
+        connection.close()
+
+    cache = ForecastCache(cache_dir)
+    writer = Writer(db_file, cache, archive_file)
+    writer.start()
+
+    start = time.perf_counter()
+    latencies = {}
+    unchanged = 0
+    failed = 0
+    try:
+        for office_code, status, forecast_json, latencies[office_code] in iter_refresh_forecasts(
+            region_codes, cache, CONSUMER, force=force, max_workers=max_workers
+        ):
+            count("jma_fetch_total", status=status, consumer=CONSUMER)
+            # 取得は jma_client のスレッドで行われるので、かかった時間をあとから記録する
+            seconds = latencies[office_code]
+            metrics.observe("pipeline_fetch", seconds, started=time.time() - seconds)
+            if status == "updated":
+                # 解析できない地域は取り込み済みにせず、次回また取り込む
+                try:
+                    rows = parse_forecast(office_code, forecast_json)
+                except ValueError as e:
+                    logging.warning(e)
+                    failed += 1
+                    continue
+                writer.put(office_code, forecast_json, *rows)
+            elif status == "unchanged":
+                unchanged += 1
+            else:
+                logging.warning(f"地域コード {office_code} のデータ取得に失敗しました。")
+                failed += 1
+    finally:
+        writer.finish()
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"取得: {latency_summary(latencies)}")
+    logging.info(
+        f"更新 {writer.offices_written} 地域 / 変化なし {unchanged} 地域 / 失敗 {failed} 地域: "
+        f"{writer.rows_written} 件を保存、アーカイブに {writer.reports_archived} 件を追加（書き込み {writer.write_seconds * 1000:.1f}ms, 全体 {elapsed:.2f}s）"
+    )
+    return writer.updated_codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="天気と週間気温を1回の取得でweather.dbに取り込む")
+    parser.add_argument("--db", default=DB_FILE, help="書き込み先のデータベース")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="同時接続数")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="予報の履歴を追記するデータベース")
+    parser.add_argument("--no-archive", action="store_true", help="履歴を残さない")
+    parser.add_argument("--base-url", default=BASE_URL, help="取得先（ローカルの fixture_server.py など）")
+    parser.add_argument("--area-json", default=AREA_JSON, help="取得する地域コードを読むarea.json")
+    parser.add_argument("--remote-area", action="store_true", help="地域コードを取得先のarea.jsonから読む")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="スナップショットとキャッシュの保存先")
+    args = parser.parse_args()
+    # METRICS_PORT・METRICS_LOG が指定されていれば計測結果を書き出す
+    start_exporters()
+    set_base_url(args.base_url)
+    region_codes = get_area_codes(fetch_json(area_url())) if args.remote_area else None
+    run(
+        args.db, area_json=args.area_json, max_workers=args.workers,
+        archive_file=None if args.no_archive else args.archive,
+        cache_dir=args.cache_dir, region_codes=region_codes,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import sqlite3
+
+# weather.db のスキーマバージョン（PRAGMA user_version に保存）
+#   0: 旧スキーマ（AUTOINCREMENTのidのみ、索引なし、weather_temperaturesあり）
+#   1: (area_code, forecast_date) を主キーにした WITHOUT ROWID テーブル
+#   2: 降水確率・信頼度と気温の上限・下限の列を追加
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_forecast (
+    area_code TEXT NOT NULL,
+    forecast_date TEXT NOT NULL,
+    weather_code TEXT,
+    pop INTEGER,
+    reliability TEXT,
+    PRIMARY KEY (area_code, forecast_date)
+) WITHOUT ROWID;
+
+-- 府県予報区に週間気温の地点が複数あるときは、先頭の代表地点の値だけを入れる
+CREATE TABLE IF NOT EXISTS weekly_temp (
+    area_code TEXT NOT NULL,
+    forecast_date TEXT NOT NULL,
+    temps_min REAL,
+    temps_max REAL,
+    temps_min_upper REAL,
+    temps_min_lower REAL,
+    temps_max_upper REAL,
+    temps_max_lower REAL,
+    PRIMARY KEY (area_code, forecast_date)
+) WITHOUT ROWID;
+
+-- 地域ごとの検索は主キーの順に並んだ表そのものが索引になる。
+-- 日付ごとに全国を集計する問い合わせ用に、日付から引ける索引も持つ。
+CREATE INDEX IF NOT EXISTS weekly_temp_by_date
+    ON weekly_temp (forecast_date, temps_min, temps_max);
+"""
+
+# 同じ地域・日付のデータがあれば上書きする
+UPSERT_WEATHER = """
+INSERT INTO weather_forecast (area_code, forecast_date, weather_code)
+VALUES (?, ?, ?)
+ON CONFLICT (area_code, forecast_date) DO UPDATE SET
+    weather_code = excluded.weather_code
+"""
+
+# 気温の行は府県予報区・日付ごとに1行（代表地点）だけを渡す
+UPSERT_TEMP = """
+INSERT INTO weekly_temp (area_code, forecast_date, temps_min, temps_max)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (area_code, forecast_date) DO UPDATE SET
+    temps_min = excluded.temps_min,
+    temps_max = excluded.temps_max
+"""
+
+# 1回の取得から両方のテーブルに入れるときの全列版
+UPSERT_WEATHER_DETAIL = """
+INSERT INTO weather_forecast (area_code, forecast_date, weather_code, pop, reliability)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (area_code, forecast_date) DO UPDATE SET
+    weather_code = excluded.weather_code,
+    pop = excluded.pop,
+    reliability = excluded.reliability
+"""
+
+UPSERT_TEMP_DETAIL = """
+INSERT INTO weekly_temp (
+    area_code, forecast_date, temps_min, temps_max,
+    temps_min_upper, temps_min_lower, temps_max_upper, temps_max_lower
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (area_code, forecast_date) DO UPDATE SET
+    temps_min = excluded.temps_min,
+    temps_max = excluded.temps_max,
+    temps_min_upper = excluded.temps_min_upper,
+    temps_min_lower = excluded.temps_min_lower,
+    temps_max_upper = excluded.temps_max_upper,
+    temps_max_lower = excluded.temps_max_lower
+"""
+
+# v1 から v2 で追加した列
+V2_COLUMNS = {
+    "weather_forecast": ("pop INTEGER", "reliability TEXT"),
+    "weekly_temp": (
+        "temps_min_upper REAL", "temps_min_lower REAL",
+        "temps_max_upper REAL", "temps_max_lower REAL",
+    ),
+}
+
+# 新しい予報の期間より前の日付を消す（地域ごとに予報期間分だけを残す）
+PRUNE_WEATHER = "DELETE FROM weather_forecast WHERE area_code = ? AND forecast_date < ?"
+PRUNE_TEMP = "DELETE FROM weekly_temp WHERE area_code = ? AND forecast_date < ?"
+
+
+def _table_exists(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def _create_tables(conn):
+    # executescriptは実行前にCOMMITしてしまうので、移行のトランザクション内では1文ずつ実行する
+    for statement in SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def _migrate_from_v0(conn):
+    """旧スキーマのテーブルを主キー付きのテーブルに移し替える"""
+    for name in ("weather_forecast", "weekly_temp"):
+        if _table_exists(conn, name):
+            conn.execute(f"ALTER TABLE {name} RENAME TO {name}_v0")
+    _create_tables(conn)
+
+    # 天気の重複している行はidが大きい（後から入れた）ものを残す
+    if _table_exists(conn, "weather_forecast_v0"):
+        conn.execute("""
+            INSERT INTO weather_forecast (area_code, forecast_date, weather_code)
+            SELECT area_code, forecast_date, weather_code FROM weather_forecast_v0
+            WHERE area_code IS NOT NULL AND forecast_date IS NOT NULL
+            ORDER BY id
+            ON CONFLICT (area_code, forecast_date) DO UPDATE SET
+                weather_code = excluded.weather_code
+        """)
+        conn.execute("DROP TABLE weather_forecast_v0")
+    # 旧temps.pyは取り込みのたびにテーブルを作り直し、府県予報区の全地点を地点順に入れていた。
+    # 重複している行は別の地点なので、idが小さい（先頭の代表地点の）ものを残す
+    if _table_exists(conn, "weekly_temp_v0"):
+        conn.execute("""
+            INSERT INTO weekly_temp (area_code, forecast_date, temps_min, temps_max)
+            SELECT area_code, forecast_date, temps_min, temps_max FROM weekly_temp_v0
+            WHERE true
+            ORDER BY id
+            ON CONFLICT (area_code, forecast_date) DO NOTHING
+        """)
+        conn.execute("DROP TABLE weekly_temp_v0")
+
+    # 使われていなかった weather_temperatures は weekly_temp にない分だけ取り込んで削除
+    if _table_exists(conn, "weather_temperatures"):
+        conn.execute("""
+            INSERT INTO weekly_temp (area_code, forecast_date, temps_min, temps_max)
+            SELECT area_code, forecast_date, temps_min, temps_max FROM weather_temperatures
+            WHERE true
+            ORDER BY created_at, id
+            ON CONFLICT (area_code, forecast_date) DO NOTHING
+        """)
+        conn.execute("DROP TABLE weather_temperatures")
+
+
+def _migrate_from_v1(conn):
+    """v1 のテーブルに列を追加する"""
+    _create_tables(conn)
+    for table, columns in V2_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column in columns:
+            if column.split()[0] not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+
+def ensure_schema(conn):
+    """スキーマを最新にする（必要なら旧テーブルを移行）。移行した場合はTrue"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        _create_tables(conn)
+        conn.commit()
+        return False
+    try:
+        conn.execute("BEGIN")
+        if version < 1:
+            # v0 からは最新のテーブルを作ってそのまま移し替える
+            _migrate_from_v0(conn)
+        else:
+            _migrate_from_v1(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python jmaII/schema.py weather.db
+    path = sys.argv[1] if len(sys.argv) > 1 else "weather.db"
+    connection = sqlite3.connect(path)
+    try:
+        migrated = ensure_schema(connection)
+        if migrated:
+            print(f"{path}: スキーマを v{SCHEMA_VERSION} に移行しました")
+        else:
+            print(f"{path}: スキーマは v{SCHEMA_VERSION} です")
+    finally:
+        connection.close()
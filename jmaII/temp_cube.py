@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+import numpy as np
+
+# jma/ 配下の共通モジュールを読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jma'))
+
+from area_index import AreaIndex
+from data_access import load_area
+from forecast_cache import CACHE_DIR, ForecastCache
+
+# 週間気温を 府県予報区 × 日付 × 種類 の配列にして、全国の集計を配列演算で行う
+#
+#   python jmaII/temp_cube.py --db weather.db
+
+DB_FILE = "weather.db"
+
+# 3つめの軸の並び（weekly_temp の列と同じ）
+CHANNELS = (
+    "temps_min", "temps_max",
+    "temps_min_upper", "temps_min_lower", "temps_max_upper", "temps_max_lower",
+)
+
+CUBE_QUERY = """
+SELECT area_code, forecast_date, {columns}
+FROM weekly_temp
+ORDER BY area_code, forecast_date
+"""
+
+
+def _column(values):
+    # None は NaN にする
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+class TempCube:
+    """府県予報区 × 日付 × 気温の種類 の配列（値がないところはNaN）
+
+    normals には府県予報区ごとの平年値 (最低, 最高) を持つ（なければNaN）。
+    作ったあとは配列を書き換えないこと。集計の途中結果は使い回す。
+    """
+
+    def __init__(self, offices, dates, values, normals=None):
+        self.offices = list(offices)
+        self.dates = list(dates)
+        self.values = values
+        self.normals = normals if normals is not None else np.full((len(self.offices), 2), np.nan)
+        self.office_position = {code: i for i, code in enumerate(self.offices)}
+        self.date_position = {date: i for i, date in enumerate(self.dates)}
+        self._groups = {}
+
+    @classmethod
+    def from_rows(cls, rows, normals=None):
+        """weekly_temp の行 (地域コード, 日付, 各種類の気温...) から作る"""
+        if not rows:
+            return cls([], [], np.full((0, 0, len(CHANNELS)), np.nan))
+        codes, dates, *channels = zip(*rows)
+        offices, office_index = np.unique(np.array(codes), return_inverse=True)
+        days, date_index = np.unique(np.array(dates), return_inverse=True)
+        values = np.full((len(offices), len(days), len(CHANNELS)), np.nan)
+        values[office_index, date_index] = np.stack([_column(channel) for channel in channels], axis=1)
+        cube = cls(offices.tolist(), days.tolist(), values)
+        if normals:
+            cube.normals = np.array([normals.get(code, (np.nan, np.nan)) for code in cube.offices], dtype=np.float64)
+        return cube
+
+    @classmethod
+    def from_db(cls, db_file=DB_FILE, normals=None):
+        connection = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+        try:
+            # スキーマ v1 のデータベースには上限・下限の列がないのでNULLとして読む
+            available = {row[1] for row in connection.execute("PRAGMA table_info(weekly_temp)")}
+            columns = ", ".join(name if name in available else "NULL" for name in CHANNELS)
+            rows = connection.execute(CUBE_QUERY.format(columns=columns)).fetchall()
+        finally:
+            connection.close()
+        return cls.from_rows(rows, normals)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def channel(self, name):
+        """(府県予報区, 日付) の2次元配列"""
+        return self.values[:, :, CHANNELS.index(name)]
+
+    def _extreme_by_day(self, name, coldest):
+        grid = self.channel(name)
+        filled = np.where(np.isnan(grid), np.inf if coldest else -np.inf, grid)
+        positions = filled.argmin(axis=0) if coldest else filled.argmax(axis=0)
+        picked = grid[positions, np.arange(grid.shape[1])]
+        return [
+            (date, self.offices[position] if not np.isnan(value) else None, float(value))
+            for date, position, value in zip(self.dates, positions, picked)
+        ]
+
+    def coldest_by_day(self, name="temps_min"):
+        """日ごとに最も低い府県予報区の (日付, コード, 気温)"""
+        return self._extreme_by_day(name, coldest=True)
+
+    def warmest_by_day(self, name="temps_max"):
+        """日ごとに最も高い府県予報区の (日付, コード, 気温)"""
+        return self._extreme_by_day(name, coldest=False)
+
+    def groups(self, key, group_of):
+        """府県予報区をグループに分けた (グループ名の一覧, 各府県予報区のグループ番号) を返す（keyごとに1回だけ作る）"""
+        if key not in self._groups:
+            labels = {}
+            indexes = np.array(
+                [labels.setdefault(group_of(code), len(labels)) for code in self.offices], dtype=np.intp
+            )
+            self._groups[key] = (list(labels), indexes)
+        return self._groups[key]
+
+    def rollup(self, labels, indexes, name="temps_max", how="max"):
+        """グループ × 日付 の集計（how は max・min・mean。NaNは除く）"""
+        grid = self.channel(name)
+        shape = (len(labels), grid.shape[1])
+        if how == "mean":
+            valid = ~np.isnan(grid)
+            totals = np.zeros(shape)
+            counts = np.zeros(shape)
+            np.add.at(totals, indexes, np.where(valid, grid, 0.0))
+            np.add.at(counts, indexes, valid)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return totals / counts
+        result = np.full(shape, np.nan)
+        (np.fmax if how == "max" else np.fmin).at(result, indexes, grid)
+        return result
+
+    def by_center(self, index, name="temps_max", how="max"):
+        """地方（centers）ごとの集計を (地方コードの一覧, 地方 × 日付 の配列) で返す"""
+        labels, indexes = self.groups("centers", lambda code: _center_of(index, code))
+        return labels, self.rollup(labels, indexes, name, how)
+
+    def anomalies(self):
+        """平年値との差 (府県予報区, 日付, [最低, 最高])"""
+        observed = self.values[:, :, [CHANNELS.index("temps_min"), CHANNELS.index("temps_max")]]
+        return observed - self.normals[:, np.newaxis, :]
+
+    def save(self, path):
+        np.savez_compressed(
+            path, offices=np.array(self.offices), dates=np.array(self.dates),
+            values=self.values, normals=self.normals,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["offices"].tolist(), data["dates"].tolist(), data["values"], data["normals"])
+
+
+def _center_of(index, office_code):
+    parent = index.parent(office_code, "offices")
+    return parent[1] if parent else None
+
+
+def normals_from_forecast(forecast_json):
+    """週間予報の tempAverage から (最低, 最高) の平年値を取り出す
+
+    weekly_temp と同じく、週間気温の先頭の代表地点の値を使う（なければNone）。
+    """
+    try:
+        weekly = forecast_json[1]
+    except (IndexError, TypeError):
+        return None
+    station = None
+    for series in weekly.get("timeSeries", []):
+        areas = series.get("areas", [])
+        if areas and ("tempsMin" in areas[0] or "tempsMax" in areas[0]):
+            station = areas[0].get("area", {}).get("code")
+    for area in weekly.get("tempAverage", {}).get("areas", []):
+        if area.get("area", {}).get("code") == station:
+            try:
+                return float(area["min"]), float(area["max"])
+            except (KeyError, TypeError, ValueError):
+                return None
+    return None
+
+
+def load_normals(office_codes, cache_dir=CACHE_DIR):
+    """forecasts/{code}.json の tempAverage から府県予報区ごとの平年値を読む"""
+    cache = ForecastCache(cache_dir)
+    normals = {}
+    for code in office_codes:
+        value = normals_from_forecast(cache.load(code))
+        if value is not None:
+            normals[code] = value
+    return normals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="週間気温の全国集計")
+    parser.add_argument("--db", default=DB_FILE, help="読み込むデータベース")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="平年値を読む予報のスナップショット")
+    args = parser.parse_args()
+
+    index = AreaIndex(load_area())
+    start = time.perf_counter()
+    cube = TempCube.from_db(args.db, load_normals(index.codes("offices"), args.cache_dir))
+    print(f"{cube.shape[0]} 地域 × {cube.shape[1]} 日を {(time.perf_counter() - start) * 1000:.1f}ms で読み込みました")
+
+    def timed(label, func):
+        start = time.perf_counter()
+        result = func()
+        print(f"{label}: {(time.perf_counter() - start) * 1e6:.0f}µs")
+        return result
+
+    cube.by_center(index)  # グループ分けを先に作っておく
+    for date, code, value in timed("日ごとの最低", cube.coldest_by_day):
+        if code is not None:
+            print(f"  {date[:10]} {index.name(code, 'offices')} {value:.0f}°C")
+    labels, maxima = timed("地方ごとの最高", lambda: cube.by_center(index))
+    for center, row in zip(labels, maxima):
+        values = " ".join("  -" if np.isnan(v) else f"{v:3.0f}" for v in row)
+        print(f"  {index.name(center, 'centers') or center}: {values}")
+    anomalies = timed("平年差", cube.anomalies)
+    if cube.offices and not np.all(np.isnan(anomalies)):
+        office, day, kind = np.unravel_index(np.nanargmax(np.abs(anomalies)), anomalies.shape)
+        print(
+            f"  平年差が最も大きい: {index.name(cube.offices[office], 'offices')} {cube.dates[day][:10]} "
+            f"{'最高' if kind else '最低'} {anomalies[office, day, kind]:+.1f}°C"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,155 @@
+import os
+import sys
 import sqlite3
-import requests
-import json
+import time
+import argparse
+
+# jma/ 配下の共通モジュールを読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jma'))
+
+from area_cache import load_area, region_codes
+from forecast_cache import ForecastCache
+from jma_client import forecast_url, refresh_forecast
+from metrics import count, start_exporters, timed
+from schema import PRUNE_TEMP, SCHEMA_VERSION, UPSERT_TEMP, ensure_schema
 
 DB_FILE = "weather.db"
-BASE_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/"
 AREA_JSON = "jmaII/area.json"  # area.jsonファイルのパス
+CONSUMER = "temps"  # キャッシュ上の利用者名
+
+def connect(db_file=DB_FILE):
+    """一括書き込み用の接続を開く"""
+    connection = sqlite3.connect(db_file)
+    # WALなら読み取り中のアプリを止めずに書き込める。NORMALでもWALではコミット単位の整合性は保たれる
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute('PRAGMA temp_store=MEMORY')
+    return connection
 
-def delete_table():
+def delete_table(connection):
     """テーブルを削除する"""
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-    cursor.execute('DROP TABLE IF EXISTS weekly_temp')  # テーブル削除
+    connection.execute('DROP TABLE IF EXISTS weekly_temp')  # テーブル削除
     connection.commit()
-    connection.close()
     print("テーブルが削除されました。")
 
-def create_table():
+def create_table(connection):
     """weekly_tempテーブルを作成する"""
-    connection = sqlite3.connect(DB_FILE)
-    cursor = connection.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS weekly_temp (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            area_code TEXT NOT NULL,
-            forecast_date TEXT NOT NULL,
-            temps_min REAL,
-            temps_max REAL
-        )
-    ''')
-    connection.commit()
-    connection.close()
+    # 旧スキーマなら (area_code, forecast_date) を主キーにしたテーブルに移行する
+    if ensure_schema(connection):
+        print(f"データベースをスキーマ v{SCHEMA_VERSION} に移行しました。")
     print("テーブルが作成されました。")
+    # テーブルが空なら全件取り込みが必要
+    return connection.execute('SELECT 1 FROM weekly_temp LIMIT 1').fetchone() is None
 
-def fetch_weather_data(area_code):
-    """気象庁APIからデータを取得"""
-    url = f"{BASE_URL}{area_code}.json"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
+@timed()
+def fetch_weather_data(area_code, cache, force=False):
+    """気象庁APIからデータを取得（前回から変化がなければNone）"""
+    url = forecast_url(area_code)
+    status, data, _ = refresh_forecast(area_code, cache, CONSUMER, force=force)
+    count("jma_fetch_total", status=status, consumer=CONSUMER)
+    if status == "updated":
         print(f"データ取得成功: {url}")
-        return response.json()
-    except requests.RequestException as e:
-        print(f"データ取得エラー: {e}")
-        return None
+    elif status == "unchanged":
+        print(f"更新なし: {url}")
+    else:
+        print(f"データ取得エラー: {url}")
+    return data
 
-def parse_and_save_weather(area_code, weather_json):
-    """JSONから天気予報データを解析し、データベースに保存"""
+@timed()
+def parse_weather(area_code, weather_json):
+    """JSONから週間気温データを解析し、(地域コード, 日付, 最低気温, 最高気温) のリストを返す"""
+    rows = []
     try:
-        connection = sqlite3.connect(DB_FILE)
-        cursor = connection.cursor()
-
-        # 予報情報と気温データの解析
         for series in weather_json[1].get("timeSeries", []):
             if "tempsMin" in series["areas"][0]:  # 週間気温データを探す
-                for area in series["areas"]:
-                    area_name = area.get("area", {}).get("name")
-                    temps_min = area.get("tempsMin", [])
-                    temps_max = area.get("tempsMax", [])
-                    time_defines = series.get("timeDefines", [])
-
-                    # データの整合性を確認しながら挿入
-                    for i, date in enumerate(time_defines):
-                        temp_min = float(temps_min[i]) if i < len(temps_min) and temps_min[i] else None
-                        temp_max = float(temps_max[i]) if i < len(temps_max) and temps_max[i] else None
-
-                        cursor.execute('''
-                            INSERT INTO weekly_temp (area_code, forecast_date, temps_min, temps_max)
-                            VALUES (?, ?, ?, ?)
-                        ''', (area_code, date, temp_min, temp_max))
-
-        connection.commit()
-        print(f"{area_code}のデータがデータベースに保存されました。")
+                # 地点が複数ある府県予報区は、先頭の代表地点の値を府県予報区コードで保存する
+                area = series["areas"][0]
+                temps_min = area.get("tempsMin", [])
+                temps_max = area.get("tempsMax", [])
+                time_defines = series.get("timeDefines", [])
+
+                # データの整合性を確認しながら追加
+                for i, date in enumerate(time_defines):
+                    temp_min = float(temps_min[i]) if i < len(temps_min) and temps_min[i] else None
+                    temp_max = float(temps_max[i]) if i < len(temps_max) and temps_max[i] else None
+                    rows.append((area_code, date, temp_min, temp_max))
     except Exception as e:
-        print(f"データ解析エラー: {e}")
-    finally:
-        connection.close()
+        print(f"データ解析エラー ({area_code}): {e}")
+        return []
+    return rows
+
+@timed()
+def save_rows(connection, rows):
+    """気温データを1つのトランザクションでまとめて保存し、(件数, 所要秒数) を返す"""
+    # 新しい予報期間より前の日付は削除する
+    first_dates = {}
+    for area_code, date, _, _ in rows:
+        first_dates[area_code] = min(date, first_dates.get(area_code, date))
+
+    start = time.perf_counter()
+    with connection:
+        connection.executemany(UPSERT_TEMP, rows)
+        connection.executemany(PRUNE_TEMP, first_dates.items())
+    count("jma_rows_written_total", len(rows), table="weekly_temp")
+    return len(rows), time.perf_counter() - start
+
+def scale_rows(rows, scale):
+    """負荷確認用に、地域コードを変えて行をscale倍に複製する"""
+    if scale <= 1:
+        return rows
+    scaled = list(rows)
+    for k in range(1, scale):
+        scaled.extend((f"{area_code}-{k}", date, temp_min, temp_max) for area_code, date, temp_min, temp_max in rows)
+    return scaled
 
 def list_all_region_codes():
     """area.jsonから全ての地域コードを取得"""
-    with open(AREA_JSON, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    
-    region_codes = []
-    for center_code, center_info in data['centers'].items():
-        region_codes.extend(center_info['children'])
-    
-    return region_codes
+    return region_codes(load_area(AREA_JSON))
 
 def main():
-    # 既存のテーブルを削除
-    delete_table()
-
-    # データベースのテーブルを作成
-    create_table()
-
-    # area.jsonからすべての地域コードを取得
-    region_codes = list_all_region_codes()
-    print(f"取得した地域コード: {region_codes}")
-
-    # 各地域コードごとに天気データを取得し、保存
-    for area_code in region_codes:
-        print(f"データ取得中: {area_code}")
-        weather_json = fetch_weather_data(area_code)
-        if weather_json:
-            parse_and_save_weather(area_code, weather_json)
-        else:
-            print(f"地域コード {area_code} のデータ取得に失敗しました。")
+    parser = argparse.ArgumentParser(description="週間気温をweather.dbに取り込む")
+    parser.add_argument("--db", default=None, help=f"書き込み先のデータベース（省略時は {DB_FILE}）")
+    parser.add_argument("--scale", type=int, default=1, help="負荷確認用に行を何倍に複製するか（--dbで別ファイルを指定すること）")
+    args = parser.parse_args()
+    # 複製した行をアプリが読む weather.db に書き込まないよう、書き込み先の指定を必須にする
+    if args.scale > 1 and args.db is None:
+        parser.error("--scale を2以上にするときは --db で書き込み先を指定してください")
+    args.db = args.db or DB_FILE
+    # METRICS_PORT・METRICS_LOG が指定されていれば計測結果を書き出す
+    start_exporters()
+
+    connection = connect(args.db)
+    try:
+        # データベースのテーブルを作成（差分更新のため既存のテーブルは残す）
+        force = create_table(connection) or args.scale > 1
+        cache = ForecastCache()
+
+        # area.jsonからすべての地域コードを取得
+        region_codes = list_all_region_codes()
+        print(f"取得した地域コード: {region_codes}")
+
+        # 全地域の気温データを集めてから一度に保存する
+        rows = []
+        updated_codes = []
+        for area_code in region_codes:
+            print(f"データ取得中: {area_code}")
+            weather_json = fetch_weather_data(area_code, cache, force=force)
+            if weather_json:
+                parsed = parse_weather(area_code, weather_json)
+                # 解析できなかった地域は取り込み済みにせず、次回また取り直す
+                if parsed:
+                    rows.extend(parsed)
+                    updated_codes.append(area_code)
+
+        written, elapsed = save_rows(connection, scale_rows(rows, args.scale))
+        rate = written / elapsed if elapsed > 0 else 0
+        print(f"{written} 件を {elapsed * 1000:.1f}ms で保存しました（{rate:,.0f} 件/秒）。")
+
+        if args.scale <= 1:
+            for area_code in updated_codes:
+                cache.mark_ingested(area_code, CONSUMER)
+    finally:
+        connection.close()
 
 if __name__ == "__main__":
     main()
@@ -1,26 +1,32 @@
+import os
+import sys
 import sqlite3
-import requests
 import json
 import logging
 from datetime import datetime
 
+# jma/ 配下の共通モジュールを読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'jma'))
+
+from area_cache import load_area, region_codes as region_codes_of
+from forecast_cache import ForecastCache
+from jma_client import refresh_forecast
+from metrics import count, start_exporters, timed
+from schema import PRUNE_WEATHER, SCHEMA_VERSION, UPSERT_WEATHER, ensure_schema
+
 # ログ設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # SQLiteデータベース設定
 DB_NAME = 'weather.db'
 
-# 天気予報APIのベースURL
-BASE_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/"
+# キャッシュ上の利用者名
+CONSUMER = "weather"
 
 def load_region_codes(json_file_path):
     """JSONファイルから地域コードを抽出"""
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        region_codes = []
-        for center in data.get("centers", {}).values():
-            region_codes.extend(center.get("children", []))
+        region_codes = region_codes_of(load_area(json_file_path))
         logging.info(f"{len(region_codes)} 地域コードを読み込みました。")
         return region_codes
     except (FileNotFoundError, json.JSONDecodeError) as e:
@@ -33,35 +39,31 @@ def create_database():
     conn = sqlite3.connect(DB_NAME)
     try:
         cursor = conn.cursor()
-        # 既存テーブルがあれば削除（開発中のみ推奨、本番ではALTER TABLEを検討）
-        cursor.execute('DROP TABLE IF EXISTS weather_forecast')
-        cursor.execute('''
-            CREATE TABLE weather_forecast (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                area_code TEXT,
-                forecast_date TEXT,
-                weather_code TEXT
-            )
-        ''')
-        conn.commit()
+        # 差分更新のため既存テーブルは残す（旧スキーマなら移行する）
+        if ensure_schema(conn):
+            logging.info(f"データベースをスキーマ v{SCHEMA_VERSION} に移行しました。")
         logging.info("データベースとテーブルを作成しました。")
+        # テーブルが空なら全件取り込みが必要
+        return cursor.execute('SELECT 1 FROM weather_forecast LIMIT 1').fetchone() is None
     finally:
         conn.close()
 
 
-def fetch_weather_data(region_code):
-    """指定された地域コードから天気予報データを取得"""
-    url = f"{BASE_URL}{region_code}.json"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # HTTPエラーがある場合は例外を発生
+@timed()
+def fetch_weather_data(region_code, cache, force=False):
+    """指定された地域コードから天気予報データを取得（前回から変化がなければNone）"""
+    status, data, _ = refresh_forecast(region_code, cache, CONSUMER, force=force)
+    count("jma_fetch_total", status=status, consumer=CONSUMER)
+    if status == "updated":
         logging.info(f"地域コード {region_code} のデータ取得に成功しました。")
-        return response.json()
-    except requests.RequestException as e:
-        logging.warning(f"地域コード {region_code} のデータ取得に失敗しました: {e}")
-        return None
+    elif status == "unchanged":
+        logging.info(f"地域コード {region_code} のデータは更新されていません。")
+    else:
+        logging.warning(f"地域コード {region_code} のデータ取得に失敗しました。")
+    return data
 
 
+@timed()
 def process_region_weather_data(region_code, forecast_json):
     """地域ごとの天気予報データを抽出"""
     result = []
@@ -87,31 +89,39 @@ def process_region_weather_data(region_code, forecast_json):
         return []
 
 
+@timed()
 def save_to_database(data):
     """天気データをSQLiteデータベースに保存"""
     conn = sqlite3.connect(DB_NAME)
     try:
         cursor = conn.cursor()
-        cursor.executemany('''
-            INSERT INTO weather_forecast (area_code, forecast_date, weather_code)
-            VALUES (?, ?, ?)
-        ''', data)
+        cursor.executemany(UPSERT_WEATHER, data)
+        # 新しい予報期間より前の日付は削除する
+        first_dates = {}
+        for area_code, forecast_date, _ in data:
+            first_dates[area_code] = min(forecast_date, first_dates.get(area_code, forecast_date))
+        cursor.executemany(PRUNE_WEATHER, first_dates.items())
         conn.commit()
+        count("jma_rows_written_total", len(data), table="weather_forecast")
         logging.info(f"{len(data)} 件のデータをデータベースに保存しました。")
     finally:
         conn.close()
 
 
 def main():
+    # METRICS_PORT・METRICS_LOG が指定されていれば計測結果を書き出す
+    start_exporters()
+
     # JSONファイルから地域コードをロード
     region_codes = load_region_codes('jmaII/area.json')
 
     # データベースとテーブルを初期化
-    create_database()
+    force = create_database()
+    cache = ForecastCache()
 
-    # 天気予報データを取得して保存
+    # 更新された地域の天気予報データだけを取得して保存
     for region_code in region_codes:
-        forecast_json = fetch_weather_data(region_code)
+        forecast_json = fetch_weather_data(region_code, cache, force=force)
         if not forecast_json:
             continue
 
@@ -119,6 +129,7 @@ def main():
         region_weather_data = process_region_weather_data(region_code, forecast_json)
         if region_weather_data:
             save_to_database(region_weather_data)
+        cache.mark_ingested(region_code, CONSUMER)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import functools
+import os
+import sqlite3
+import threading
+
+# SQLiteのデータベースファイルパス
+DB_FILE = "weather.db"
+
+# 読み取り用接続の設定
+MMAP_SIZE = 64 * 1024 * 1024  # 64MB
+CACHE_SIZE_KB = 8 * 1024  # 8MB
+CACHED_STATEMENTS = 64
+
+# 地域ごとの天気と気温（アプリから繰り返し実行するので文字列を固定して文のキャッシュを効かせる）
+FORECAST_QUERY = """
+SELECT f.forecast_date, f.weather_code, t.temps_min, t.temps_max
+FROM weather_forecast AS f
+JOIN weekly_temp AS t
+ON f.area_code = t.area_code AND f.forecast_date = t.forecast_date
+WHERE f.area_code = ?
+ORDER BY f.forecast_date
+"""
+
+
+class WeatherDB:
+    """weather.db への読み取り専用の接続をスレッドごとに持つ
+
+    Fletは複数のセッションのイベントを別スレッドで処理するため、
+    sqlite3の接続はスレッド間で共有せず、スレッドごとに1本を使い回す。
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._wal_checked = False
+
+    def _enable_wal(self):
+        # WALにしておくと取り込み中でも読み取りが待たされない（設定はファイルに残る）
+        with self._lock:
+            if self._wal_checked:
+                return
+            self._wal_checked = True
+            try:
+                conn = sqlite3.connect(self.path)
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                pass
+
+    def connection(self):
+        """このスレッド用の読み取り専用接続"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                raise sqlite3.OperationalError(f"データベースがありません: {self.path}")
+            self._enable_wal()
+            conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True,
+                check_same_thread=False, cached_statements=CACHED_STATEMENTS,
+            )
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def fetch_forecast(self, area_code):
+        """地域コードの日付ごとの (日付, 天気コード, 最低気温, 最高気温)"""
+        return self.query(FORECAST_QUERY, (area_code,))
+
+    def close(self):
+        """すべてのスレッドの接続を閉じる"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def get_db(path=DB_FILE):
+    """プロセス内で共有するWeatherDB"""
+    return WeatherDB(path)
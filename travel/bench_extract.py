@@ -0,0 +1,134 @@
+import argparse
+import glob
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from extract import PARSERS, REVIEW_CLASS, USER_CLASS, RATING_CLASS
+
+# 口コミページの解析速度（ページ/秒）を解析方法ごとに比べる
+#
+#   python travel/bench_extract.py --fixtures travel/fixtures   # crawler.py --save-fixtures で保存したページ
+#   python travel/bench_extract.py --synthetic 100              # 実際のページと同じくらいの大きさの合成ページ
+#   python travel/bench_extract.py --workers 4                  # プロセスプールでの並列解析も計測
+
+HOTEL_NAME = "ベンチマーク"
+SCRAPED_AT = "2025-01-01 00:00:00"
+
+# 解析方法によって扱いが分かれやすいページ（結果が soup と一致するかだけを確かめる）
+EDGE_PAGES = (
+    b"",
+    b" \r\n ",
+    '<?xml version="1.0" encoding="utf-8"?><html><body><div class="jlnpc-kuchikomiCassette"></div></body></html>',
+    b'<html><head><meta charset="x-unknown"></head><body><div class="jlnpc-kuchikomiCassette"></div></body></html>',
+)
+
+
+def make_page(rng, reviews=30, encoding="utf-8"):
+    """口コミページと同じ構造の合成ページ（口コミ以外の部分も同じくらいの量にする）"""
+    charset = "Shift_JIS" if encoding.lower().replace("-", "_") in ("shift_jis", "sjis", "cp932") else "UTF-8"
+    parts = [
+        f'<!DOCTYPE html><html lang="ja"><head><meta http-equiv="Content-Type" content="text/html; charset={charset}">',
+        "<title>口コミ・評判</title>",
+        "".join(f'<link rel="stylesheet" href="/css/common{i}.css">' for i in range(10)),
+        "<script>" + "var dataLayer = dataLayer || [];" * 200 + "</script></head><body>",
+        '<div id="header"><ul class="nav">'
+        + "".join(f'<li class="nav-item"><a href="/area/{i}/">エリア{i}</a></li>' for i in range(300))
+        + "</ul></div>",
+        '<div id="main"><div class="jlnpc-kuchikomiList">',
+    ]
+    for i in range(reviews):
+        label = "" if rng.random() < 0.1 else (
+            f'<span class="{USER_CLASS} c-label--gray">{rng.choice(["男性", "女性"])}/{rng.choice(["20代", "30代", "40代", "50代"])}</span>'
+        )
+        body = "".join(rng.choice("とても良かった部屋が清潔で朝食も美味しい駅から近い") for _ in range(300))
+        parts.append(
+            f'<div class="{REVIEW_CLASS}"><div class="{REVIEW_CLASS}__head">'
+            f'<div class="{REVIEW_CLASS}__user">{label}<span class="c-label">{rng.randint(1, 12)}月宿泊</span></div>'
+            f'<div class="{RATING_CLASS}"><span class="c-rating__val">{rng.randint(1, 5)}</span></div></div>'
+            f'<dl class="{REVIEW_CLASS}__rates">'
+            + "".join(f"<dt>項目{k}</dt><dd>{rng.randint(1, 5)}</dd>" for k in range(6))
+            + f'</dl><p class="{REVIEW_CLASS}__postBody">{body}</p>'
+            f'<ul class="{REVIEW_CLASS}__photos">'
+            + "".join(f'<li><img src="/photo/{i}_{k}.jpg" alt=""></li>' for k in range(rng.randint(0, 4)))
+            + "</ul></div>"
+        )
+    parts.append('</div></div><div id="footer">' + "<p>フッター</p>" * 200 + "</div></body></html>")
+    return "".join(parts).encode(encoding, errors="replace")
+
+
+def load_pages(fixtures=None, synthetic=50, seed=0, encoding="utf-8"):
+    if fixtures:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(fixtures, "*.html"))):
+            with open(path, 'rb') as f:
+                pages.append(f.read())
+        if not pages:
+            raise SystemExit(f"{fixtures} に .html がありません")
+        return pages
+    rng = random.Random(seed)
+    return [make_page(rng, encoding=encoding) for _ in range(synthetic)]
+
+
+def _parse_all(name, pages):
+    parse = PARSERS[name]
+    return [parse(page, HOTEL_NAME, SCRAPED_AT) for page in pages]
+
+
+def _parse_one(name, page):
+    return PARSERS[name](page, HOTEL_NAME, SCRAPED_AT)
+
+
+def bench_serial(name, pages, repeat):
+    """1プロセスで全ページを repeat 回解析し、最も速かった回の (ページ/秒, 結果) を返す"""
+    best = float("inf")
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = _parse_all(name, pages)
+        best = min(best, time.perf_counter() - start)
+    return len(pages) / best, rows
+
+
+def bench_pool(name, pages, workers):
+    """プロセスプールで全ページを解析したときのページ/秒（ページの受け渡しを含む）"""
+    with ProcessPoolExecutor(workers) as executor:
+        # ワーカーの起動とモジュールの読み込みは計測に含めない
+        list(executor.map(_parse_one, [name] * workers, pages[:workers]))
+        start = time.perf_counter()
+        list(executor.map(_parse_one, [name] * len(pages), pages, chunksize=max(1, len(pages) // (workers * 4))))
+        return len(pages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="口コミページの解析速度を比べる")
+    parser.add_argument("--fixtures", help="保存したページのディレクトリ（省略時は合成ページ）")
+    parser.add_argument("--synthetic", type=int, default=50, help="合成するページ数")
+    parser.add_argument("--encoding", default="utf-8", help="合成ページの文字コード")
+    parser.add_argument("--repeat", type=int, default=3, help="各方法の実行回数")
+    parser.add_argument("--workers", type=int, default=0, help="プロセスプールの大きさ（0なら計測しない）")
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures, args.synthetic, encoding=args.encoding)
+    size = sum(len(page) for page in pages) / len(pages) / 1024
+    print(f"{len(pages)} ページ（平均 {size:.0f}KB）")
+
+    baseline, expected = bench_serial("soup", pages, args.repeat)
+    edge_expected = _parse_all("soup", EDGE_PAGES)
+    print(f"{'soup':<10}{baseline:>10.1f} ページ/秒")
+    for name in PARSERS:
+        if name == "soup":
+            continue
+        rate, rows = bench_serial(name, pages, args.repeat)
+        same = "一致" if rows == expected and _parse_all(name, EDGE_PAGES) == edge_expected else "結果が異なります"
+        print(f"{name:<10}{rate:>10.1f} ページ/秒（{rate / baseline:.1f}倍, {same}）")
+
+    if args.workers > 0:
+        for name in PARSERS:
+            rate = bench_pool(name, pages, args.workers)
+            print(f"{name:<10}{rate:>10.1f} ページ/秒（{args.workers} プロセス）")
+
+
+if __name__ == "__main__":
+    main()
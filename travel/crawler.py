@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+
+from extract import PARSERS, get_parser
+
+# じゃらんの口コミを複数の宿から集めて review.sqlite に保存する（data.ipynb の処理をまとめたもの）
+#
+#   python travel/crawler.py                              # data.ipynb と同じ3軒
+#   python travel/crawler.py --hotels hotels.json --concurrency 16
+#   python travel/crawler.py --save-fixtures travel/fixtures   # 取得したHTMLを保存する
+#   python travel/crawler.py --fixtures travel/fixtures        # 保存したHTMLから読み込む（通信しない）
+#   python travel/crawler.py --parse-workers 4                  # 解析を別プロセスで行う
+#
+# 同じホストへのリクエストはトークンバケットで間隔を空け、宿ごとのページ送りは並行して行う。
+# 全体の所要時間は、宿の数ではなくホストごとの取得間隔で決まる。
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DB_PATH = "travel/review.sqlite"
+
+# 1ページの口コミ数（idx はページごとにこの数ずつ進む）
+PAGE_SIZE = 30
+MAX_PAGES = 10
+
+# ホストごとの1秒あたりのリクエスト数と、まとめて送ってよい数
+RATE = 1.0
+BURST = 1
+# 同時に口コミをたどる宿の数
+CONCURRENCY = 8
+
+TIMEOUT = 10
+RETRIES = 2
+BACKOFF = 2.0
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+CREATE_REVIEW = '''CREATE TABLE IF NOT EXISTS review (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    gender TEXT,
+    age TEXT,
+    rating TEXT,
+    hotel_name TEXT,
+    scraping_date DATETIME
+)'''
+INSERT_REVIEW = 'INSERT INTO review (gender, age, rating, hotel_name, scraping_date) VALUES (?, ?, ?, ?, ?)'
+
+# 宿の名前と、{page}（1から）と {idx}（(page - 1) * 30）を埋める口コミページのURL
+Hotel = namedtuple("Hotel", ["name", "url"])
+
+HOTELS = [
+    Hotel("旅館A", 'https://www.jalan.net/yad301124/kuchikomi/{page}.HTML?rootCd=041&childPriceFlg=0,0,0,0,0&roomCrack=100000&screenId=UWW3701&idx={idx}&smlCd=140102&dateUndecided=1&adultNum=1&yadNo=301124&callbackHistFlg=1&distCd=01'),
+    Hotel("ホテルB", 'https://www.jalan.net/yad328118/kuchikomi/{page}.HTML?childPriceFlg=0,0,0,0,0&roomCrack=200000&rootCd=041&screenId=UWW3701&idx={idx}&smlCd=140102&dateUndecided=1&adultNum=2&yadNo=328118&callbackHistFlg=1&distCd=01'),
+    Hotel("ホテルC", 'https://www.jalan.net/yad348664/kuchikomi/{page}.HTML?rootCd=041&childPriceFlg=0,0,0,0,0&roomCrack=200000&screenId=UWW3701&idx={idx}&smlCd=140102&dateUndecided=1&adultNum=2&yadNo=348664&callbackHistFlg=1&distCd=01'),
+]
+
+# 宿番号だけ分かっているときのURL
+YAD_URL = 'https://www.jalan.net/yad{yad_no}/kuchikomi/{{page}}.HTML?screenId=UWW3701&idx={{idx}}&yadNo={yad_no}'
+
+
+def page_url(hotel, page):
+    return hotel.url.format(page=page, idx=(page - 1) * PAGE_SIZE)
+
+
+def load_hotels(path):
+    """[{"name": ..., "url": ...} または {"name": ..., "yadNo": ...}] のJSONから宿の一覧を読む"""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return [
+        Hotel(entry["name"], entry.get("url") or YAD_URL.format(yad_no=entry["yadNo"]))
+        for entry in entries
+    ]
+
+
+class TokenBucket:
+    """1秒あたり rate 回、最大 burst 回まで続けて通すトークンバケット"""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # 待っている順に1つずつトークンを渡す
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """ホストごとに TokenBucket を持つ（rate が None なら間隔を空けない）"""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    async def wait(self, url):
+        if self.rate is None:
+            return
+        host = urlsplit(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        await bucket.acquire()
+
+
+def fixture_name(url):
+    """URLに対応する保存用のファイル名（{宿番号}_{ページ}.html）"""
+    match = re.search(r'/yad(\d+)/kuchikomi/(?:(\d+)\.HTML)?', url)
+    if match is None:
+        raise ValueError(f"口コミページのURLではありません: {url}")
+    return f"{match.group(1)}_{match.group(2) or 1}.html"
+
+
+class HttpFetcher:
+    """requests で口コミページを取得する（ブロッキングなので別スレッドで呼ぶ）
+
+    save_dir を指定すると、取得したHTMLを FixtureFetcher で読める名前で保存する。
+    """
+
+    def __init__(self, timeout=TIMEOUT, save_dir=None):
+        self.timeout = timeout
+        self.save_dir = save_dir
+        self._local = threading.local()
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+
+    def _session(self):
+        # requests.Session はスレッドセーフではないのでスレッドごとに持つ
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(HEADERS)
+        return session
+
+    def _get(self, url):
+        response = self._session().get(url, timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        if self.save_dir:
+            with open(os.path.join(self.save_dir, fixture_name(url)), 'wb') as f:
+                f.write(response.content)
+        return response.content
+
+    async def fetch(self, url):
+        """ページのHTML（bytes）。ページがなければNone"""
+        return await asyncio.to_thread(self._get, url)
+
+
+class FixtureFetcher:
+    """保存しておいたHTMLを返す（通信しない）"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    async def fetch(self, url):
+        path = os.path.join(self.directory, fixture_name(url))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class FetchError(Exception):
+    """リトライしても取得できなかったページ（ページがない404とは区別する）"""
+
+
+class Crawler:
+    """宿ごとに口コミのページを順にたどり、ページごとに on_page(宿, ページ, 口コミ) を呼ぶ
+
+    宿は最大 concurrency 軒を並行してたどり、リクエストの間隔は limiter がホストごとに調整する。
+    口コミがないページ・存在しないページか、max_pages に達したらその宿は終わり。
+    取得に失敗した宿は途中までの件数を残し、failed に (宿の名前, ページ, エラー) を記録する。
+    executor（ProcessPoolExecutor など）を渡すと、解析は取得とは別のプロセスで行う。
+    """
+
+    def __init__(self, fetcher, limiter=None, concurrency=CONCURRENCY, max_pages=MAX_PAGES,
+                 retries=RETRIES, backoff=BACKOFF, parser=None, executor=None):
+        self.fetcher = fetcher
+        self.parser = parser or get_parser()
+        self.executor = executor
+        self.limiter = limiter or HostRateLimiter()
+        self.concurrency = concurrency
+        self.max_pages = max_pages
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = 0
+        self.failed = []
+
+    async def fetch_page(self, url):
+        """ページのHTML。ページがなければNone、リトライしても取得できなければ FetchError"""
+        for attempt in range(self.retries + 1):
+            await self.limiter.wait(url)
+            self.requests += 1
+            try:
+                return await self.fetcher.fetch(url)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise FetchError(f"{url} の取得に失敗しました: {e}") from e
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def parse(self, html, hotel_name):
+        scraped_at = datetime.now().isoformat(" ")
+        if self.executor is None:
+            return self.parser(html, hotel_name, scraped_at)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.parser, html, hotel_name, scraped_at)
+
+    async def crawl_hotel(self, hotel, on_page):
+        total = 0
+        for page in range(1, self.max_pages + 1):
+            try:
+                html = await self.fetch_page(page_url(hotel, page))
+            except FetchError as e:
+                logging.warning(f"{hotel.name}: {e}")
+                self.failed.append((hotel.name, page, e))
+                break
+            if html is None:
+                logging.info(f"{hotel.name}: {page}ページ目はありません。")
+                break
+            try:
+                rows = await self.parse(html, hotel.name)
+            except Exception as e:
+                # 解析できないページは飛ばして次のページへ進む
+                logging.warning(f"{hotel.name}: {page}ページ目の解析に失敗しました: {e!r}")
+                continue
+            if not rows:
+                logging.info(f"{hotel.name}: {page}ページ目にはレビューがありません。")
+                break
+            on_page(hotel, page, rows)
+            total += len(rows)
+        return total
+
+    async def crawl(self, hotels, on_page):
+        """宿の名前ごとの口コミ件数を返す"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(hotel):
+            async with semaphore:
+                return hotel.name, await self.crawl_hotel(hotel, on_page)
+
+        return dict(await asyncio.gather(*(run(hotel) for hotel in hotels)))
+
+
+def open_db(path=DB_PATH, reset=False):
+    con = sqlite3.connect(path)
+    if reset:
+        # 既存のテーブルを削除（data.ipynb と同じく取り直す）
+        con.execute('DROP TABLE IF EXISTS review')
+    con.execute(CREATE_REVIEW)
+    con.commit()
+    return con
+
+
+def main():
+    parser = argparse.ArgumentParser(description="じゃらんの口コミを集めてreview.sqliteに保存する")
+    parser.add_argument("--db", default=DB_PATH, help="保存先のデータベース")
+    parser.add_argument("--reset", action="store_true", help="reviewテーブルを作り直す")
+    parser.add_argument("--hotels", help="宿の一覧のJSON（省略時は data.ipynb の3軒）")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES, help="1軒あたりの最大ページ数")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="同時にたどる宿の数")
+    parser.add_argument("--rate", type=float, default=RATE, help="ホストごとの1秒あたりのリクエスト数")
+    parser.add_argument("--burst", type=int, default=BURST, help="続けて送ってよいリクエスト数")
+    parser.add_argument("--fixtures", help="保存したHTMLから読み込む（通信しない）")
+    parser.add_argument("--save-fixtures", help="取得したHTMLを保存するディレクトリ")
+    parser.add_argument("--parser", default="auto", choices=["auto", *PARSERS], help="口コミの取り出し方")
+    parser.add_argument("--parse-workers", type=int, default=0, help="解析に使うプロセス数（0なら取得と同じスレッド）")
+    args = parser.parse_args()
+
+    hotels = load_hotels(args.hotels) if args.hotels else HOTELS
+    if args.fixtures:
+        fetcher = FixtureFetcher(args.fixtures)
+        # 保存したHTMLを読むだけなので間隔は空けない
+        limiter = HostRateLimiter(rate=None)
+    else:
+        fetcher = HttpFetcher(save_dir=args.save_fixtures)
+        limiter = HostRateLimiter(args.rate, args.burst)
+    executor = ProcessPoolExecutor(args.parse_workers) if args.parse_workers > 0 else None
+    crawler = Crawler(
+        fetcher, limiter, args.concurrency, args.max_pages,
+        parser=get_parser(args.parser), executor=executor,
+    )
+
+    con = open_db(args.db, reset=args.reset)
+    try:
+        def on_page(hotel, page, rows):
+            # 書き込みはイベントループのスレッドだけで行う
+            with con:
+                con.executemany(INSERT_REVIEW, rows)
+
+        start = time.perf_counter()
+        counts = asyncio.run(crawler.crawl(hotels, on_page))
+        elapsed = time.perf_counter() - start
+    finally:
+        con.close()
+        if executor is not None:
+            executor.shutdown()
+
+    for name, total in counts.items():
+        print(f"{name}: {total} 件")
+    print(f"{len(hotels)} 軒・{crawler.requests} リクエストを {elapsed:.1f}s で取得しました。")
+    if crawler.failed:
+        print(f"取得に失敗した宿: {len(crawler.failed)} 軒（それまでのページは保存済み）")
+        for name, page, error in crawler.failed:
+            print(f"  {name}: {page}ページ目 - {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from datetime import datetime
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.dammit import EncodingDetector
+
+# 口コミページから口コミの部分だけを取り出す
+#
+# どれも parse(html, hotel_name, scraped_at=None) で (性別, 年代, 総合評価, 宿の名前, 取得日時) の一覧を返す。
+#
+#   soup      ページ全体の木を作ってから探す（data.ipynb と同じ方法）
+#   strainer  SoupStrainer で口コミの要素だけを木にする
+#   lxml      lxml で解析し、XPathで口コミの要素だけを読む（いちばん速い）
+#
+# get_parser() は使えるもののうち速いものを返す。別プロセスで呼べるようにすべてモジュール直下の関数にしている。
+
+try:
+    import lxml.html
+    from lxml.etree import ParserError
+except ImportError:
+    lxml = None
+
+# 口コミ1件の要素・性別と年代・総合評価
+REVIEW_CLASS = 'jlnpc-kuchikomiCassette'
+USER_CLASS = 'c-label'
+RATING_CLASS = 'jlnpc-kuchikomiCassette__totalRate'
+
+
+def _row(user_text, rating_text, hotel_name, scraped_at):
+    # 性別・年代がない口コミは前の口コミの値を引き継がないようにNoneにする
+    gender = age = None
+    if user_text is not None:
+        gender_age = user_text.strip().split('/')
+        gender = gender_age[0] or None
+        age = gender_age[1] if len(gender_age) > 1 else None
+    rating = rating_text.strip() if rating_text is not None else None
+    return (gender, age, rating, hotel_name, scraped_at)
+
+
+def _rows_from_soup(reviews, hotel_name, scraped_at):
+    rows = []
+    for review in reviews:
+        user_info = review.find('span', class_=USER_CLASS)
+        rating = review.find('div', class_=RATING_CLASS)
+        rows.append(_row(
+            user_info.text if user_info else None,
+            rating.text if rating else None,
+            hotel_name, scraped_at,
+        ))
+    return rows
+
+
+def parse_soup(html, hotel_name, scraped_at=None):
+    """ページ全体を html.parser で木にしてから口コミを探す"""
+    scraped_at = scraped_at or datetime.now().isoformat(" ")
+    soup = BeautifulSoup(html, 'html.parser')
+    return _rows_from_soup(soup.find_all('div', class_=REVIEW_CLASS), hotel_name, scraped_at)
+
+
+# 口コミの要素とその子孫だけを木にする
+REVIEW_STRAINER = SoupStrainer('div', class_=REVIEW_CLASS)
+
+
+def parse_strainer(html, hotel_name, scraped_at=None):
+    """口コミの要素だけを木にしてから読む（lxmlがあればBeautifulSoupの解析にも使う）"""
+    scraped_at = scraped_at or datetime.now().isoformat(" ")
+    soup = BeautifulSoup(html, 'lxml' if lxml else 'html.parser', parse_only=REVIEW_STRAINER)
+    return _rows_from_soup(soup.find_all('div', class_=REVIEW_CLASS), hotel_name, scraped_at)
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+REVIEW_XPATH = f"//div[{_has_class(REVIEW_CLASS)}]"
+USER_XPATH = f".//span[{_has_class(USER_CLASS)}]"
+RATING_XPATH = f".//div[{_has_class(RATING_CLASS)}]"
+
+# 文字コードごとのlxmlのパーサー
+_lxml_parsers = {}
+
+
+def _lxml_document(html):
+    if isinstance(html, str):
+        return lxml.html.document_fromstring(html)
+    # Shift_JISのページもあるので、BeautifulSoupと同じく meta の宣言に従って読む
+    encoding = EncodingDetector.find_declared_encoding(html, is_html=True) or 'utf-8'
+    parser = _lxml_parsers.get(encoding)
+    if parser is None:
+        parser = _lxml_parsers[encoding] = lxml.html.HTMLParser(encoding=encoding)
+    return lxml.html.document_fromstring(html, parser=parser)
+
+
+def parse_lxml(html, hotel_name, scraped_at=None):
+    """lxmlで解析し、口コミの要素だけをXPathで読む
+
+    lxmlが読めないページ（空のページ・未知の文字コード・XML宣言つきの文字列）は parse_strainer で読む。
+    """
+    scraped_at = scraped_at or datetime.now().isoformat(" ")
+    try:
+        document = _lxml_document(html)
+    except (ParserError, LookupError, ValueError):
+        return parse_strainer(html, hotel_name, scraped_at)
+    rows = []
+    for review in document.xpath(REVIEW_XPATH):
+        user_info = review.xpath(USER_XPATH)
+        rating = review.xpath(RATING_XPATH)
+        rows.append(_row(
+            user_info[0].text_content() if user_info else None,
+            rating[0].text_content() if rating else None,
+            hotel_name, scraped_at,
+        ))
+    return rows
+
+
+PARSERS = {"soup": parse_soup, "strainer": parse_strainer}
+if lxml is not None:
+    PARSERS["lxml"] = parse_lxml
+
+
+def get_parser(name="auto"):
+    """名前に対応する解析関数（auto なら使えるもののうち速いもの）"""
+    if name == "auto":
+        return PARSERS.get("lxml", parse_strainer)
+    try:
+        return PARSERS[name]
+    except KeyError:
+        raise ValueError(f"使えない解析方法です: {name}（{', '.join(PARSERS)}）") from None
+
+
+parse_reviews = get_parser()